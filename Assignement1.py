@@ -1,35 +1,27 @@
-import PIL
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 from IPython.display import display
+import numpy as np
+from contact_sheet import make_contact_sheet
 file = "basic.jpg"
 img = Image.open(file).convert("RGB")
 
-images=[] 
-for shade in range(10,1,-4):
-    layer = Image.new('RGB', img.size, color=(0,255,255))
-    output = Image.blend(img, layer, shade/30)
-    images.append(output)
-for shade in range(10,1,-4):
-    layer = Image.new('RGB', img.size, color=(255,0,255))
-    output = Image.blend(img, layer, shade/30)
-    images.append(output)
-for shade in range(10,1,-4):
-    layer = Image.new('RGB', img.size, color=(255,255,0))
-    output = Image.blend(img, layer, shade/30)
-    images.append(output)    
-    
-x=0
-y=0
-contact_sheet=PIL.Image.new(img.mode, (3*img.width,3*img.height))
-for insert in images:
-    contact_sheet.paste(insert,(x,y))
-    if x+img.width == contact_sheet.width:
-        x=0
-        y=y+img.height
-    else:
-        x=x+img.width
+# the sheet is shown at 1200x750, so every one of the 3x3 tiles ends up 400x250. Blending
+# is the same per pixel whatever the size, so shrink the image to that size first and
+# only blend the pixels we actually keep
+sheet_size = (1200, 750)
+tile_size = (sheet_size[0]//3, sheet_size[1]//3)
+tile = np.asarray(img.resize(tile_size), dtype=np.float32)
 
-contact_sheet=contact_sheet.resize((1200,750))
+# all nine tints in one go: blending with a solid colour layer is
+# pixel + alpha*(colour - pixel), so broadcasting the three colours against the three
+# alphas against the pixels gives a (colour, shade, height, width, channel) array
+colours = np.array([(0,255,255), (255,0,255), (255,255,0)], dtype=np.float32)
+alphas = np.array([shade/30 for shade in range(10,1,-4)], dtype=np.float32)
+tints = tile + alphas[None,:,None,None,None]*(colours[:,None,None,None,:] - tile)
+# Image.blend truncates towards zero, so do the same
+images = tints.clip(0, 255).astype(np.uint8).reshape((-1,) + tile.shape)
+
+contact_sheet = make_contact_sheet(images, columns=3, tile_size=tile_size, mode=img.mode)
 display(contact_sheet)
 
 
@@ -22,15 +22,37 @@
 # In[1]:
 
 
-import math
-import zipfile
-from PIL import Image, ImageOps, ImageDraw
-import pytesseract
-import cv2 as cv
-import numpy as np
-
-# loading the face detection classifier
-face_cascade = cv.CascadeClassifier('readonly/haarcascade_frontalface_default.xml')
+import os
+import page_pipeline
+from page_index import PageIndex
+from page_dedup import PageDeduplicator
+from keyword_index import KeywordIndex
+from face_store import FaceStore
+from contact_sheet import make_contact_sheet
+from tracing import PageTracer
+
+# the page processing lives in page_pipeline.py so that a process pool can run it.
+# Set WORKERS to 1 to process the pages one by one in this kernel
+WORKERS = os.cpu_count()
+# processed pages are kept in this file between sessions, so only new or changed pages
+# of the archive go through tesseract and the cascade again
+INDEX_PATH = 'parsed_pages.sqlite'
+# the detector settings of the original notebook: the whole page is OCRed and faces are
+# searched for at full resolution. ocr_mode='blocks' (OCR only the text blocks) and
+# detect_scale below 1 with verify_faces=True (search a smaller copy of the page, then
+# check each face at full size) are faster, but can miss faces and words, so they stay
+# off until their recall is measured against these settings
+PARAMS = dict(page_pipeline.DETECTOR_PARAMS, ocr_mode='page', detect_scale=1.0,
+              min_face_size=None, verify_faces=False)
+ARCHIVE_PATH = 'readonly/small_img.zip'
+# near-identical pages - whose 64 bit perceptual hashes differ in at most this many bits
+# and whose pixels then turn out to be the same - are only processed once (see
+# page_dedup.py). None, the default, processes every page
+MAX_HASH_DISTANCE = None
+# the boxes and thumbnails of all the faces, saved here and memory-mapped on the next run
+FACE_STORE_PATH = 'face_store'
+# set TRACE to True to time every stage of every page (see the report after the ingest)
+TRACE = False
 
 
 # In[2]:
@@ -43,91 +65,96 @@ parsed_img_src = {}
 # In[3]:
 
 
-#iterate through the zip file and save all the binarized versions to parsed_img_src
-with zipfile.ZipFile('readonly/small_img.zip', 'r') as archive:
-    for entry in archive.infolist():
-        with archive.open(entry) as file:
-            img = Image.open(file).convert('RGB')
-            parsed_img_src[entry.filename] = {'pil_img':img}
-
+#stream the archive through the page pipeline and keep only the text and the face boxes
+#of every page. The boxes then go into one array and the thumbnails into one atlas on
+#disk, which is only cut again when the faces change
+tracer = PageTracer() if TRACE else None
+dedup = None
+if MAX_HASH_DISTANCE is not None:
+    dedup = PageDeduplicator(MAX_HASH_DISTANCE, confirm='pixels')
+page_faces = {}
+with PageIndex(INDEX_PATH) as index:
+    for img_name, result in page_pipeline.ingest(ARCHIVE_PATH, workers=WORKERS, index=index,
+                                                 params=PARAMS, tracer=tracer, dedup=dedup):
+        parsed_img_src[img_name] = {'text':result['text']}
+        page_faces[img_name] = result['boxes']
 
-# In[4]:
+face_store = FaceStore.cached(FACE_STORE_PATH, page_faces, ARCHIVE_PATH)
+del page_faces
 
+#how many repeated pages were given the results of their first copy
+if dedup is not None:
+    print(dedup.report())
 
-#parse all images text
-for img_name in parsed_img_src.keys():
-    text = pytesseract.image_to_string(parsed_img_src[img_name]['pil_img'])
-    parsed_img_src[img_name]['text'] = text
-    
+#the ten slowest pages and where their time went
+if tracer is not None:
+    print(tracer.report(10))
 
 
-# In[5]:
+# In[4]:
 
 
-#find the bounding boxes for all the faces from every page and extract them
-for img_name in parsed_img_src.keys():
-    open_cv_image = np.array(parsed_img_src[img_name]['pil_img']) 
-    img_g = cv.cvtColor(open_cv_image, cv.COLOR_BGR2GRAY)
-    faces_bounding_boxes = face_cascade.detectMultiScale(img_g, 1.3, 5)
-    parsed_img_src[img_name]['faces'] = []
-    for x,y,w,h in faces_bounding_boxes:
-        face = parsed_img_src[img_name]['pil_img'].crop((x,y,x+w,y+h))
-        parsed_img_src[img_name]['faces'].append(face)
+#build the keyword index once, so every search is a lookup instead of a scan of every page
+keyword_index = KeywordIndex.from_pages(parsed_img_src)
 
 
 # In[6]:
 
 
-#create thumbnails
-for img_name in parsed_img_src.keys():
-    for face in parsed_img_src[img_name]['faces']:
-        face.thumbnail((100,100),Image.ANTIALIAS)
+#look the keyword up in the index and return the faces of every page it is on. The
+#keyword can also be a phrase ('Mark Twain'), a prefix ('Chris*') or a word the OCR may
+#have got a letter wrong in ('Christopher~', which also finds 'Chrlstopher')
+def search(keyword):
+    for img_name in keyword_index.lookup(keyword):
+        if(len(face_store.page_boxes(img_name)) != 0):
+            print("Result found in file {}".format(img_name))
+            faces = face_store.thumbnails(img_name)
+            display(make_contact_sheet(faces, columns=5, tile_size=(100,100)))
+        else:
+            print("Result found in file {} \nBut there were no faces in that file\n\n".format(img_name))
+    return
+
+
+#answer a whole list of keywords at once and return the results instead of showing them:
+#{keyword -> {page name -> [(x,y,w,h) face boxes]}}. Every keyword is a lookup in the
+#index, so a batch of thousands of keywords never scans the pages
+def search_many(keywords):
+    return {keyword: {img_name: face_store.boxes_of(img_name) for img_name in pages}
+            for keyword, pages in keyword_index.lookup_many(keywords).items()}
 
 
 # In[7]:
 
 
-#search the keyword in every page's text and return the faces
-def search(keyword):
-    for img_name in parsed_img_src:
-        if (keyword in parsed_img_src[img_name]['text']):
-            if(len(parsed_img_src[img_name]['faces']) != 0):
-                print("Result found in file {}".format(img_name))
-                h = math.ceil(len(parsed_img_src[img_name]['faces'])/5)
-                contact_sheet=Image.new('RGB',(500, 100*h))
-                xc = 0
-                yc = 0
-                for img in parsed_img_src[img_name]['faces']:
-                    contact_sheet.paste(img, (xc, yc))
-                    if xc + 100 == contact_sheet.width:
-                        xc = 0
-                        yc += 100
-                    else:
-                        xc += 100
-                        
-                display(contact_sheet)
-            else:
-                print("Result found in file {} \nBut there were no faces in that file\n\n".format(img_name))
-    return
 
+search('Christopher')
 
-# In[8]:
 
+# In[8]:
 
 
-search('Christopher')
+search('Mark')
 
 
 # In[9]:
 
 
-search('Mark')
+search('pizza')
+
+
+# In[ ]:
+
+
+#the same three keywords as one batch, as structured results, and the names again
+#allowing for an OCR error
+search_many(['Christopher', 'Mark', 'pizza', 'Christopher~', 'Mark~'])
 
 
 # In[10]:
 
 
-search('pizza')
+#how many faces there are and the memory their boxes and thumbnails take
+face_store.nbytes()
 
 
 # In[ ]:
@@ -363,6 +363,15 @@ for img in images:
     # And update the current_location counter
     current_location=current_location+450
 
+# Pasting one image at a time and keeping track of the location by hand gets fiddly quickly, and
+# we do it again in the assignment and the final project. So there is a little helper in the
+# contact_sheet module next to this notebook which does all of it for us. We tell it how many
+# columns the grid has and how big each tile is, and it works out the rows itself. Underneath it
+# creates the whole sheet as a single numpy array and copies every image straight into its cell,
+# which is much quicker when there are lots of images. Here is the same sheet again, one column wide
+from contact_sheet import make_contact_sheet
+contact_sheet=make_contact_sheet(images, columns=1, tile_size=first_image.size, mode=first_image.mode)
+
 # This contact sheet has gotten big: 4,500 pixels tall! Lets just resize this sheet for display. We can do
 # this using the resize() function. This function just takes a tuple of width and height, and we'll resize
 # everything down to the size of just two individual images
@@ -398,6 +407,9 @@ for img in images[1:]:
     else:
         x=x+first_image.width
 
+# And again, the make_contact_sheet() helper does the same thing for us with three columns
+contact_sheet=make_contact_sheet(images[1:], columns=3, tile_size=first_image.size, mode=first_image.mode)
+
 # Now lets resize the contact sheet. We'll just make it half the size by dividing it by two. And, because
 # the resize function needs to take round numbers, we need to convert our divisions from floating point
 # numbers into integers using the int() function.
@@ -406,6 +418,25 @@ contact_sheet = contact_sheet.resize((int(contact_sheet.width/2),int(contact_she
 display(contact_sheet)
 
 
+# In[ ]:
+
+
+# Notice that we did a lot of work here only to throw most of it away: every brightness version was
+# made at full size, and then we shrank the whole sheet down. It is quicker to shrink the image once
+# and make the versions from the small copy. And there is a trick for brightness too. Brightness
+# (and contrast) change every pixel value on its own, so a pixel which is 100 always becomes the same
+# new value. There are only 256 possible values per band, so we can work out the answer for each of
+# them once - a lookup table - and let point() apply it to the whole image. The image_variants module
+# next to this notebook does this for us, and it gives exactly the same result as ImageEnhance. It
+# works for 'brightness', 'contrast', 'color' and 'sharpness', so lets make a sheet of each
+from image_variants import enhance_variants
+tile_size=(int(first_image.width/2),int(first_image.height/2))
+for kind in ['brightness', 'contrast', 'color', 'sharpness']:
+    print(kind)
+    variants=enhance_variants(image, [i/10 for i in range(1, 10)], tile_size=tile_size, kind=kind)
+    display(make_contact_sheet(variants, columns=3, tile_size=tile_size))
+
+
 # Well, that's been a tour of our first external API, the Python Imaging Library, or pillow module. In this series of lectures you've learned how to read and write images, manipulat them with pillow, and explore the functionality of third party APIs using features of Python like dir(), help(), and getmro(). You've also been introduced to the console, and how python stores these libraries on the computer. While for this course all of the libraries are included for you in the Coursera system, and you won't need to install your own, it's good to get a the idea of how this work in case you wanted to set this up on your own.
 # 
 # Finally, while you can explore PILLOW from within python, most good modules also put their documentation up online, and you can read more about PILLOW here: https://pillow.readthedocs.io/en/latest/
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Random access to the entries of a ZIP archive from many threads or processes at once.
+# zipfile.ZipFile reads through one shared file object behind a lock, so entries are
+# inflated one after another. An ArchiveReader reads the central directory once, maps
+# the archive file into memory and works out where every entry's data starts, so any
+# entry can be read without a seek or a lock:
+#   - stored (uncompressed) entries come back as a memoryview of the mapping, no copy
+#   - deflated entries are inflated straight from the mapping; zlib releases python's
+#     lock while it works, so threads inflate side by side
+# Other compression methods and encrypted entries fall back to zipfile. Every process
+# should make its own reader (page_pipeline's pool workers do), which is their own
+# handle on the archive.
+
+import fnmatch
+import mmap
+import struct
+import threading
+import zipfile
+import zlib
+
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class ArchiveReader:
+    def __init__(self, path, verify=True):
+        self.path = path
+        self.verify = verify
+        self._zip = zipfile.ZipFile(path, 'r')
+        self._zip_lock = threading.Lock()
+        self.infos = {info.filename: info for info in self._zip.infolist() if not info.is_dir()}
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._offsets = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    #the ZipInfo of the entries, optionally only those whose name matches a glob pattern
+    #and whose uncompressed size is within min_size and max_size. Nothing is decoded
+    def entries(self, pattern=None, min_size=None, max_size=None):
+        return [info for info in self.infos.values()
+                if (pattern is None or fnmatch.fnmatch(info.filename, pattern))
+                and (min_size is None or info.file_size >= min_size)
+                and (max_size is None or info.file_size <= max_size)]
+
+    #where the data of an entry starts: after its local header, whose name and extra
+    #field can differ in length from the central directory's, so it is read once here
+    def _data_offset(self, info):
+        offset = self._offsets.get(info.filename)
+        if offset is None:
+            header = _LOCAL_HEADER.unpack_from(self._map, info.header_offset)
+            if header[0] != _LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile('bad local header for {!r}'.format(info.filename))
+            name_length, extra_length = header[9], header[10]
+            offset = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+            self._offsets[info.filename] = offset
+        return offset
+
+    #the content of an entry: a memoryview into the archive for stored entries, bytes
+    #otherwise
+    def read(self, name):
+        info = self.infos[name]
+        if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED,
+                                                              zipfile.ZIP_DEFLATED):
+            with self._zip_lock:
+                return self._zip.read(info)
+        start = self._data_offset(info)
+        raw = self._view[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_STORED:
+            data = raw
+        else:
+            data = zlib.decompress(raw, -zlib.MAX_WBITS, info.file_size or zlib.DEF_BUF_SIZE)
+        if self.verify and zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile('bad CRC for {!r}'.format(name))
+        return data
+
+    #memoryviews of stored entries handed out by read() keep the mapping alive; if any
+    #are still around it is left for the garbage collector to unmap
+    def close(self):
+        self._offsets = {}
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+        self._zip.close()
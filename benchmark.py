@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Benchmark for the stages of the newspaper search pipeline. It builds a ZIP archive of
+# pages - the bundled sample images plus generated newspaper-like pages with columns of
+# text and a photo - runs it through page_pipeline.ingest with a PageTracer, exactly as
+# the notebook does, and summarizes every stage the tracer saw, plus the ones after it:
+#
+#   read          inflating the ZIP entry
+#   decode        decoding it to greyscale
+#   faces         face detection, with verification when --verify-faces is given
+#   text_blocks   finding the text blocks, with --ocr-mode blocks
+#   ocr           tesseract (with --ocr-mode none, or when no tesseract is available,
+#                 the generated pages are indexed by the words they were drawn with)
+#   thumbnails    cutting the face thumbnails from the page
+#   search        keyword lookups against the index built over the pages
+#   contact_sheet compositing the faces of a page, and one large sheet of many faces
+#
+# The results, with percentiles per stage, page throughput and peak RSS (of this process
+# and of its largest child process), are printed as JSON (or written to --output) so runs
+# can be compared against each other.
+#
+#   python benchmark.py --pages 20 --output bench.json
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+
+from PIL import Image, ImageDraw
+import numpy as np
+
+import page_pipeline
+import ocr_engine
+from contact_sheet import make_contact_sheet
+from keyword_index import KeywordIndex
+from thumbnails import FaceThumbnails, ThumbnailCache
+from tracing import PageTracer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_IMAGES = ['basic.jpg', 'fossil.png', 'color.png', 'floyd.jpg']
+WORDS = ['Mark', 'Christopher', 'pizza', 'council', 'market', 'election', 'weather',
+         'school', 'river', 'bridge', 'mayor', 'football', 'concert', 'harbour', 'train']
+QUERIES = ['Mark', 'Christopher', 'pizza', 'Chris*', 'mayor said', 'nothing', 'Chrlstopher~']
+PAGE_SIZE = (1700, 2200)
+
+
+#a newspaper-like page: two columns of random words, and one of the sample photos.
+#Returns the page and the words drawn on it
+def generate_page(rng, photo):
+    page = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(page)
+    width, height = PAGE_SIZE
+    photo = photo.copy()
+    photo.thumbnail((width//2 - 100, height//3))
+    page.paste(photo, (width//2 + 50, 150))
+    lines = []
+    for column, top in ((0, 150), (1, 200 + photo.height)):
+        left = 60 + column*(width//2)
+        for y in range(top, height - 100, 28):
+            line = ' '.join(rng.choice(WORDS) for _ in range(7))
+            draw.text((left, y), line, fill='black')
+            lines.append(line)
+    return page, '\n'.join(lines)
+
+
+#write the benchmark archive and return {entry name -> the text drawn on it} for the
+#generated pages
+def build_archive(path, generated_pages, seed=0):
+    rng = random.Random(seed)
+    photos = [Image.open(os.path.join(HERE, name)).convert('RGB') for name in SAMPLE_IMAGES]
+    texts = {}
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, photo in zip(SAMPLE_IMAGES, photos):
+            archive.write(os.path.join(HERE, name), 'sample-' + name)
+        for i in range(generated_pages):
+            page, text = generate_page(rng, photos[i % len(photos)])
+            name = 'page-{:04d}.png'.format(i)
+            with archive.open(name, 'w') as file:
+                page.save(file, 'PNG')
+            texts[name] = text
+    return texts
+
+
+def summarize(samples):
+    if not samples:
+        return {'count':0}
+    values = np.array(samples)
+    return {'count':len(samples), 'total_s':float(values.sum()), 'mean_s':float(values.mean()),
+            'p50_s':float(np.percentile(values, 50)), 'p90_s':float(np.percentile(values, 90)),
+            'p99_s':float(np.percentile(values, 99)), 'max_s':float(values.max())}
+
+
+#peak resident memory in MB; ru_maxrss is in KB on Linux, bytes on macOS. RUSAGE_SELF is
+#this process, RUSAGE_CHILDREN the largest of its finished children: the pipeline's worker
+#processes (with --workers) and the tesseract runs of pytesseract
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak/(1024*1024) if sys.platform == 'darwin' else peak/1024
+
+
+def ocr_available():
+    try:
+        ocr_engine.get_engine().image_to_string(np.full((32, 32), 255, np.uint8))
+        return True
+    except Exception:
+        return False
+
+
+#run the archive through the page pipeline with a tracer and time the rest of a search
+#session over the result. known_texts stands in for the OCR text of the pages when
+#params['ocr_mode'] is 'none'
+def run(archive_path, params, sheet_tiles, workers=1, known_texts=None):
+    tracer = PageTracer()
+    texts = {}
+    faces = {}
+    started = time.perf_counter()
+    for name, result in page_pipeline.ingest(archive_path, workers=workers, params=params,
+                                             tracer=tracer):
+        if params['ocr_mode'] == 'none':
+            texts[name] = (known_texts or {}).get(name, '')
+        else:
+            texts[name] = result['text']
+        faces[name] = result['boxes']
+    elapsed = time.perf_counter() - started
+    names = list(texts)
+
+    stages = {}
+    for record in tracer.records.values():
+        for stage, timing in record['stages'].items():
+            stages.setdefault(stage, []).append(timing['wall_s'])
+    for stage in ('thumbnails', 'search', 'contact_sheet'):
+        stages[stage] = []
+    thumbnails = FaceThumbnails(archive_path, cache=ThumbnailCache())
+    for name in names:
+        if faces[name]:
+            t0 = time.perf_counter()
+            tiles = thumbnails.render(name, faces[name])
+            t1 = time.perf_counter()
+            make_contact_sheet(tiles, columns=5, tile_size=(100, 100))
+            stages['thumbnails'].append(t1 - t0)
+            stages['contact_sheet'].append(time.perf_counter() - t1)
+    thumbnails.close()
+
+    index = KeywordIndex()
+    for name in names:
+        index.add(name, texts[name])
+    for query in QUERIES*20:
+        t0 = time.perf_counter()
+        index.lookup(query)
+        stages['search'].append(time.perf_counter() - t0)
+
+    # one big sheet, like the faces of a common word over a large archive
+    tiles = np.random.default_rng(0).integers(0, 256, (sheet_tiles, 100, 100, 3), np.uint8)
+    t0 = time.perf_counter()
+    make_contact_sheet(tiles, columns=5, tile_size=(100, 100), format='PNG')
+    large_sheet = time.perf_counter() - t0
+
+    return {'pages':len(names), 'faces':sum(len(boxes) for boxes in faces.values()),
+            'params':params, 'workers':workers,
+            'ocr_backend':ocr_engine.get_engine().backend if params['ocr_mode'] != 'none' else None,
+            'pipeline_s':elapsed, 'throughput_pages_per_s':len(names)/elapsed,
+            'stages':{name: summarize(samples) for name, samples in stages.items()},
+            'large_contact_sheet':{'tiles':sheet_tiles, 'seconds':large_sheet},
+            'peak_rss_mb':peak_rss_mb(),
+            'peak_children_rss_mb':peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the stages of the newspaper search pipeline.')
+    parser.add_argument('--pages', type=int, default=12, help='generated pages in the archive')
+    parser.add_argument('--archive', help='benchmark this ZIP instead of a generated one')
+    parser.add_argument('--ocr-mode', choices=('page', 'blocks', 'bands', 'none'), default='page')
+    parser.add_argument('--detect-scale', type=float, default=1.0)
+    parser.add_argument('--min-face-size', type=int, help='smallest face side in page pixels')
+    parser.add_argument('--verify-faces', action='store_true',
+                        help='re-check every face at full resolution')
+    parser.add_argument('--workers', type=int, default=1, help='pipeline processes')
+    parser.add_argument('--no-ocr', action='store_true', help='same as --ocr-mode none')
+    parser.add_argument('--sheet-tiles', type=int, default=500)
+    parser.add_argument('--cascade', help='path of the Haar cascade XML')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    if args.cascade:
+        page_pipeline.CASCADE_PATH = args.cascade
+    elif not os.path.exists(page_pipeline.CASCADE_PATH):
+        page_pipeline.CASCADE_PATH = os.path.join(HERE, 'haarcascade_frontalface_default.xml')
+    ocr_mode = args.ocr_mode
+    if args.no_ocr or ocr_mode == 'none' or not ocr_available():
+        ocr_mode = 'none'
+    params = dict(page_pipeline.DETECTOR_PARAMS, ocr_mode=ocr_mode,
+                  detect_scale=args.detect_scale, verify_faces=args.verify_faces,
+                  min_face_size=(args.min_face_size,)*2 if args.min_face_size else None)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        archive_path = args.archive
+        known_texts = None
+        if archive_path is None:
+            archive_path = os.path.join(workdir, 'pages.zip')
+            known_texts = build_archive(archive_path, args.pages)
+        report = run(archive_path, params, args.sheet_tiles, args.workers, known_texts)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
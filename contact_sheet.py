@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Contact sheets: a grid of tiles composited into one image. Rather than pasting the
+# tiles one by one and keeping track of x and y by hand, the sheet is a single numpy
+# array allocated up front and every tile is written into its cell with a slice
+# assignment. A stack of equally sized tiles is laid out with one reshape.
+
+import io
+import math
+
+from PIL import Image
+import numpy as np
+
+
+#build a contact sheet from tiles, which is a list of PIL images (or arrays) or a numpy
+#stack of shape (n, height, width[, channels]). Tiles are placed left to right, top to
+#bottom, in a grid of the given columns (and rows, which by default is just enough to
+#hold all the tiles) with cells of tile_size=(width, height). A tile smaller than its
+#cell sits in the top left corner, like Image.paste would put it. Returns a PIL image,
+#or the encoded bytes if format is given ('PNG', 'JPEG', ...)
+def make_contact_sheet(tiles, columns, tile_size, rows=None, mode='RGB', background=0,
+                       format=None):
+    tile_width, tile_height = tile_size
+    channels = len(Image.new(mode, (1, 1)).getbands())
+    count = len(tiles)
+    if rows is None:
+        rows = max(math.ceil(count/columns), 1)
+    shape = (rows*tile_height, columns*tile_width) + ((channels,) if channels > 1 else ())
+    if isinstance(tiles, np.ndarray) and tiles.shape[1:3] == (tile_height, tile_width):
+        sheet = _grid_from_stack(tiles, rows, columns, shape, background)
+    else:
+        sheet = np.full(shape, background, dtype=np.uint8)
+        for i, tile in enumerate(tiles[:rows*columns]):
+            pixels = _as_array(tile, mode)[:tile_height, :tile_width]
+            top, left = (i // columns)*tile_height, (i % columns)*tile_width
+            sheet[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+    image = Image.frombytes(mode, (shape[1], shape[0]), sheet.tobytes())
+    if format is None:
+        return image
+    buffer = io.BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+
+def _as_array(tile, mode):
+    if isinstance(tile, np.ndarray):
+        return tile
+    if tile.mode != mode:
+        tile = tile.convert(mode)
+    return np.asarray(tile)
+
+
+#lay a stack of full size tiles out as a grid with one reshape: pad the stack to fill
+#the grid, split it into rows of tiles, and interleave the tile rows with the pixel rows
+def _grid_from_stack(stack, rows, columns, shape, background):
+    stack = stack[:rows*columns].astype(np.uint8, copy=False)
+    missing = rows*columns - len(stack)
+    if missing:
+        padding = np.full((missing,) + stack.shape[1:], background, dtype=np.uint8)
+        stack = np.concatenate([stack, padding])
+    tile_height, tile_width = stack.shape[1:3]
+    grid = stack.reshape((rows, columns, tile_height, tile_width) + stack.shape[3:])
+    return grid.swapaxes(1, 2).reshape(shape)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Telling whether the text tesseract gives back is an english word, as the OCR lecture
+# does while sweeping binarization thresholds. The word list is loaded once into a
+# frozenset, so every check is a single hash lookup rather than a pass over the ~370,000
+# words of the list.
+#
+#   threshold, text = sweep_thresholds(image, range(150, 170), dictionary_word)
+
+import functools
+import string
+
+
+#the words of the list, one per line. The file is only read the first time
+@functools.lru_cache(maxsize=None)
+def load_dictionary(path="readonly/words_alpha.txt"):
+    with open(path, "r") as f:
+        # split the file on the new line characters, and skip the empty last line
+        return frozenset(word for word in f.read().split("\n") if word)
+
+
+#a str.translate table keeping the lower case letters; every other character is looked
+#up through __missing__ and dropped
+class _KeepLetters(dict):
+    def __missing__(self, key):
+        return None
+
+
+KEEP_LETTERS = _KeepLetters((ord(character), character) for character in string.ascii_lowercase)
+
+
+#the text in lower case, without anything that isn't a letter
+def clean_ocr_text(strng):
+    return strng.lower().translate(KEEP_LETTERS)
+
+
+#the cleaned up word if the text is an english word, otherwise None
+def dictionary_word(strng, dictionary=None):
+    if dictionary is None:
+        dictionary = load_dictionary()
+    comparison = clean_ocr_text(strng)
+    if comparison in dictionary:
+        return comparison
+    return None
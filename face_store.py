@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# A compact store of the faces found in an archive. Rather than a python list of boxes
+# and a PIL image per face, there are two arrays:
+#   - boxes, a structured array with one (page, x, y, w, h) record per face, sorted by
+#     page, where page is the position of the page name in the pages list
+#   - atlas, one contiguous (faces, height, width, 3) uint8 array holding the thumbnail
+#     of every face in the same order, each in the top left corner of its slot like
+#     make_contact_sheet puts a smaller tile
+# The faces of a page are a slice of both, so a page's thumbnails go to
+# make_contact_sheet as one stack, and the whole store pickles as a few buffers. Saved
+# to a directory, the atlas is an .npy file that load() memory-maps, so opening the
+# faces of a large archive reads nothing until a thumbnail is shown. The CRC and size of
+# every entry the thumbnails were cut from are saved along, so cached() can tell when
+# the archive changed under a saved atlas.
+#
+#   page_faces = {img_name: result['boxes']
+#                 for img_name, result in page_pipeline.ingest(ARCHIVE_PATH)}
+#   store = FaceStore.from_pages(page_faces).build_atlas(ARCHIVE_PATH, path='faces')
+#   store = FaceStore.load('faces')
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from archive_reader import ArchiveReader
+from page_pipeline import Page
+from thumbnails import THUMBNAIL_SIZE, cut_thumbnail
+
+FACE_DTYPE = np.dtype([('page', '<i4'), ('x', '<i4'), ('y', '<i4'), ('w', '<i4'), ('h', '<i4')])
+
+
+class FaceStore:
+    def __init__(self, pages, boxes, atlas=None, size=THUMBNAIL_SIZE, entries=None):
+        self.pages = list(pages)
+        self.page_ids = {name: i for i, name in enumerate(self.pages)}
+        self.boxes = boxes
+        self.atlas = atlas
+        self.size = tuple(size)
+        # page name -> (CRC, size) of the archive entry the atlas was cut from
+        self.entries = entries or {}
+        # the faces of page i are boxes[starts[i]:starts[i + 1]]
+        self._starts = np.searchsorted(boxes['page'], np.arange(len(self.pages) + 1))
+
+    #a store of the boxes of {page name -> [(x,y,w,h) face boxes]}, without thumbnails
+    @classmethod
+    def from_pages(cls, page_faces, size=THUMBNAIL_SIZE):
+        pages = list(page_faces)
+        boxes = np.zeros(sum(len(faces) for faces in page_faces.values()), FACE_DTYPE)
+        position = 0
+        for page_id, name in enumerate(pages):
+            faces = page_faces[name]
+            if len(faces):
+                records = boxes[position:position + len(faces)]
+                records['page'] = page_id
+                records['x'], records['y'], records['w'], records['h'] = np.asarray(faces).T
+                position += len(faces)
+        return cls(pages, boxes, size=size)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _slice(self, img_name):
+        page_id = self.page_ids[img_name]
+        return slice(self._starts[page_id], self._starts[page_id + 1])
+
+    #the face records of a page, as a view of boxes
+    def page_boxes(self, img_name):
+        return self.boxes[self._slice(img_name)]
+
+    #the (x,y,w,h) face boxes of a page as tuples, like page_pipeline returns them
+    def boxes_of(self, img_name):
+        return [tuple(int(value) for value in box)
+                for box in self.page_boxes(img_name)[['x', 'y', 'w', 'h']].tolist()]
+
+    #the thumbnails of a page's faces, as a (faces, height, width, 3) view of the atlas
+    def thumbnails(self, img_name):
+        if self.atlas is None:
+            raise ValueError('the store has no atlas, call build_atlas() first')
+        return self.atlas[self._slice(img_name)]
+
+    #cut the thumbnail of every face into the atlas. With a path, the atlas is written
+    #straight into a memory-mapped file in that directory and the store is saved there,
+    #so it never has to fit in memory. Pages are decoded on a pool of threads, each page
+    #once for all of its faces
+    def build_atlas(self, archive_path, path=None, threads=4):
+        width, height = self.size
+        shape = (len(self.boxes), height, width, 3)
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            atlas = np.lib.format.open_memmap(os.path.join(path, 'atlas.npy'), mode='w+',
+                                              dtype=np.uint8, shape=shape)
+        else:
+            atlas = np.zeros(shape, np.uint8)
+        page_ids = [i for i in range(len(self.pages)) if self._starts[i + 1] > self._starts[i]]
+
+        with ArchiveReader(archive_path) as archive:
+            self.entries = _entry_keys(archive, self.pages)
+
+            def cut(page_id):
+                page = Page.from_archive(archive, self.pages[page_id])
+                start, stop = self._starts[page_id], self._starts[page_id + 1]
+                for slot, record in zip(range(start, stop), self.boxes[start:stop]):
+                    face = np.asarray(cut_thumbnail(page, (record['x'], record['y'],
+                                                           record['w'], record['h']), self.size))
+                    atlas[slot] = 0
+                    atlas[slot, :face.shape[0], :face.shape[1]] = face
+                page.release()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(cut, page_ids))
+
+        if path is not None:
+            atlas.flush()
+            self.atlas = atlas
+            self.save(path)
+        else:
+            self.atlas = atlas
+        return self
+
+    #write the store to a directory: pages.json, boxes.npy and atlas.npy. The atlas
+    #isn't written again if build_atlas already put it there
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        atlas_path = os.path.join(path, 'atlas.npy')
+        if self.atlas is not None and getattr(self.atlas, 'filename', None) != os.path.abspath(atlas_path):
+            np.save(atlas_path, self.atlas)
+        np.save(os.path.join(path, 'boxes.npy'), self.boxes)
+        with open(os.path.join(path, 'pages.json'), 'w') as f:
+            json.dump({'pages':self.pages, 'size':list(self.size),
+                       'entries':{name: list(key) for name, key in self.entries.items()}}, f)
+
+    #open a saved store. The atlas is memory-mapped read-only unless mmap is False
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, 'pages.json')) as f:
+            meta = json.load(f)
+        boxes = np.load(os.path.join(path, 'boxes.npy'))
+        atlas_path = os.path.join(path, 'atlas.npy')
+        atlas = None
+        if os.path.exists(atlas_path):
+            atlas = np.load(atlas_path, mmap_mode='r' if mmap else None)
+        entries = {name: tuple(key) for name, key in meta.get('entries', {}).items()}
+        return cls(meta['pages'], boxes, atlas, meta['size'], entries)
+
+    #{page name -> [(x,y,w,h) face boxes]}, whatever order the pages are stored in
+    def page_faces(self):
+        return {img_name: self.boxes_of(img_name) for img_name in self.pages}
+
+    #the store saved at path if it holds exactly these faces, cut from the same archive
+    #entries, otherwise a new store of them with its atlas built and saved there
+    @classmethod
+    def cached(cls, path, page_faces, archive_path, size=THUMBNAIL_SIZE, threads=4):
+        store = cls.from_pages(page_faces, size)
+        try:
+            saved = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            saved = None
+        if saved is not None and saved.atlas is not None and saved.size == store.size:
+            with ArchiveReader(archive_path) as archive:
+                entries = _entry_keys(archive, store.pages)
+            if saved.entries == entries and saved.page_faces() == store.page_faces():
+                return saved
+        return store.build_atlas(archive_path, path, threads)
+
+    def nbytes(self):
+        return {'faces':len(self.boxes), 'boxes':self.boxes.nbytes,
+                'atlas':self.atlas.nbytes if self.atlas is not None else 0}
+
+
+#(CRC, size) of the named entries; a name no longer in the archive is left out, so the
+#keys won't match the ones saved when it was there
+def _entry_keys(archive, names):
+    return {name: (archive.infos[name].CRC, archive.infos[name].file_size)
+            for name in names if name in archive.infos}
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Many variants of one image with different ImageEnhance settings, for contact sheets.
+# Every ImageEnhance enhancer blends the image with a "degenerate" version of itself:
+#   variant = degenerate + factor*(image - degenerate)
+# For brightness the degenerate image is black and for contrast it is a solid grey, so
+# each variant is a point operation and is applied as a 256 entry lookup table per
+# band. Colour (a greyscale copy) and sharpness (a smoothed copy) blend with a real
+# image, so for those the degenerate image and the difference are computed once and
+# each variant is one numpy multiply-add. Either way the image is downscaled first.
+
+from PIL import Image, ImageFilter, ImageStat
+import numpy as np
+
+KINDS = ('brightness', 'contrast', 'color', 'sharpness')
+
+
+#return one PIL image per factor, using the same factors as ImageEnhance (0.0 gives
+#the degenerate image, 1.0 the original). kind is one of KINDS. With tile_size=(w,h)
+#the image is resized to that size once, before any variant is made
+def enhance_variants(image, factors, tile_size=None, kind='brightness'):
+    if kind not in KINDS:
+        raise ValueError("kind must be one of {}, not {!r}".format(', '.join(KINDS), kind))
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    if tile_size is not None and tuple(tile_size) != image.size:
+        image = image.resize(tuple(tile_size), Image.LANCZOS)
+    if kind in ('brightness', 'contrast'):
+        if kind == 'brightness':
+            degenerate = 0
+        else:
+            degenerate = int(ImageStat.Stat(image.convert('L')).mean[0] + 0.5)
+        bands = len(image.getbands())
+        return [image.point(_blend_table(degenerate, factor)*bands) for factor in factors]
+    if kind == 'color':
+        degenerate = image.convert('L').convert(image.mode)
+    else:
+        degenerate = image.filter(ImageFilter.SMOOTH)
+    base = np.asarray(degenerate, dtype=np.float32)
+    difference = np.asarray(image, dtype=np.float32) - base
+    return [Image.fromarray(_to_uint8(base + factor*difference)) for factor in factors]
+
+
+#the lookup table of degenerate + factor*(value - degenerate) for every value of a band
+def _blend_table(degenerate, factor):
+    values = degenerate + factor*(np.arange(256, dtype=np.float32) - degenerate)
+    return _to_uint8(values).tolist()
+
+
+#pillow's blend truncates towards zero and clips to 0-255
+def _to_uint8(values):
+    return np.clip(np.trunc(values), 0, 255).astype(np.uint8)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# An inverted index over the OCR text of the newspaper pages. It is built once after
+# ingest, so a keyword query is a dictionary lookup instead of a substring scan over
+# the full text of every page.
+#
+# Queries are matched on whole words, case sensitive like the original search:
+#   'Christopher'       pages containing the word
+#   'Mark Twain'        pages containing the words next to each other
+#   'Chris*'            pages containing a word starting with 'Chris'
+#   'Chrlstopher~'      pages containing a word at most one edit (a letter inserted,
+#                       removed or changed) away, for names the OCR got slightly wrong;
+#                       'Chrlstopher~2' allows two edits
+#
+# Fuzzy words are found through a second index from the letter trigrams of the words to
+# the words that contain them. Every edit changes at most three trigrams of a word, so
+# only words that share enough trigrams with the query can be close enough, and only
+# those are checked with an edit distance.
+
+import bisect
+import re
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# a query word, optionally followed by '*' for a prefix or '~' and an edit distance
+QUERY_PATTERN = re.compile(r'(\w+)(\*|~\d*)?')
+FUZZY_DISTANCE = 1
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+#the trigrams of a word, padded so the first and last letters get trigrams of their own
+def trigrams(word):
+    padded = '$' + word + '$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+#the Levenshtein distance between a and b, or max_distance + 1 as soon as it is clear
+#the distance is larger than max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, letter in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (letter != other)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+class KeywordIndex:
+    def __init__(self):
+        # token -> {page name -> [word positions]}
+        self.postings = {}
+        # page name -> order the page was added in, so results keep the archive order
+        self.pages = {}
+        self._sorted_tokens = None
+        # trigram -> tokens containing it, and token length -> tokens, built on the first
+        # fuzzy query
+        self._trigram_tokens = None
+        self._length_tokens = None
+
+    @classmethod
+    def from_pages(cls, parsed_img_src):
+        index = cls()
+        for img_name in parsed_img_src:
+            index.add(img_name, parsed_img_src[img_name]['text'])
+        return index
+
+    def add(self, img_name, text):
+        self.pages.setdefault(img_name, len(self.pages))
+        for position, token in enumerate(tokenize(text)):
+            self.postings.setdefault(token, {}).setdefault(img_name, []).append(position)
+        self._sorted_tokens = None
+        self._trigram_tokens = None
+        self._length_tokens = None
+
+    #build the sorted token list and the trigram index now rather than on the first
+    #prefix or fuzzy query, e.g. before serving queries where a stall would hurt
+    def prepare(self):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        if self._trigram_tokens is None:
+            self._build_trigrams()
+        return self
+
+    #all the tokens starting with prefix, found by bisecting a sorted token list that is
+    #rebuilt only after pages were added
+    def tokens_with_prefix(self, prefix):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        matches = []
+        for token in self._sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def _build_trigrams(self):
+        self._trigram_tokens = {}
+        self._length_tokens = {}
+        for token in self.postings:
+            for trigram in trigrams(token):
+                self._trigram_tokens.setdefault(trigram, []).append(token)
+            self._length_tokens.setdefault(len(token), []).append(token)
+
+    #{token -> edit distance} of the tokens at most max_distance edits away from word.
+    #A token that close shares at least len(word) - 3*max_distance of word's trigrams,
+    #so only tokens reaching that count are verified. Words too short for the count to
+    #rule anything out fall back to the tokens of a close enough length
+    def fuzzy_tokens(self, word, max_distance=FUZZY_DISTANCE):
+        if self._trigram_tokens is None:
+            self._build_trigrams()
+        grams = trigrams(word)
+        needed = len(grams) - 3*max_distance
+        if needed > 0:
+            shared = {}
+            for trigram in grams:
+                for token in self._trigram_tokens.get(trigram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            candidates = [token for token, count in shared.items() if count >= needed]
+        else:
+            candidates = [token for length in range(len(word) - max_distance,
+                                                    len(word) + max_distance + 1)
+                          for token in self._length_tokens.get(length, ())]
+        matches = {}
+        for token in candidates:
+            distance = edit_distance(word, token, max_distance)
+            if distance <= max_distance:
+                matches[token] = distance
+        return matches
+
+    #{page name -> positions} for one query word, which may end in '*' for a prefix or
+    #'~' for a fuzzy match. Merged postings are kept in cache when one is given
+    def _word_postings(self, word, cache=None):
+        word, operator = QUERY_PATTERN.fullmatch(word).groups()
+        if not operator:
+            return self.postings.get(word, {})
+        key = word + operator
+        if cache is not None and key in cache:
+            return cache[key]
+        if operator == '*':
+            tokens = self.tokens_with_prefix(word)
+        else:
+            tokens = self.fuzzy_tokens(word, int(operator[1:] or FUZZY_DISTANCE))
+        merged = {}
+        for token in tokens:
+            for img_name, positions in self.postings[token].items():
+                merged.setdefault(img_name, []).extend(positions)
+        if cache is not None:
+            cache[key] = merged
+        return merged
+
+    #the names of the pages matching a query, in the order the pages were added. cache
+    #is a dict for sharing prefix lookups between queries, see lookup_many
+    def lookup(self, query, cache=None):
+        words = [word + (operator or '') for word, operator in QUERY_PATTERN.findall(query)]
+        if not words:
+            return []
+        if len(words) == 1 and words[0] in self.postings:
+            return list(self.postings[words[0]])
+        # phrase: keep the start positions of the first word that are followed by
+        # every other word at the right offset
+        matches = {img_name: set(positions)
+                   for img_name, positions in self._word_postings(words[0], cache).items()}
+        for offset, word in enumerate(words[1:], 1):
+            postings = self._word_postings(word, cache)
+            for img_name in list(matches):
+                following = {position - offset for position in postings.get(img_name, ())}
+                matches[img_name] &= following
+                if not matches[img_name]:
+                    del matches[img_name]
+        return sorted(matches, key=self.pages.__getitem__)
+
+    #{query -> matching page names} for a whole batch of queries. Every query is a few
+    #dict lookups, and a prefix several queries share is only expanded once per batch
+    def lookup_many(self, queries):
+        cache = {}
+        return {query: self.lookup(query, cache) for query in queries}
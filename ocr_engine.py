@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# A long-lived OCR backend. pytesseract.image_to_string writes the image to a temporary
+# file, starts the tesseract program, which loads its language models from disk, and
+# parses what it prints - on every single call. When the tesserocr bindings are
+# installed, OcrEngine instead keeps a small pool of tesseract API objects alive and
+# hands them the image in memory, so the models are only loaded once per API object.
+# Without tesserocr it falls back to pytesseract, so the callers work the same either
+# way, only slower; tesserocr is an optional extra (pip install tesserocr) and the
+# engine warns once when it has to fall back.
+
+import contextlib
+import math
+import os
+import queue
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+class OcrEngine:
+    def __init__(self, lang='eng', use_tesserocr=True, max_apis=None):
+        self.lang = lang
+        self.use_tesserocr = use_tesserocr and tesserocr is not None
+        if use_tesserocr and tesserocr is None:
+            warnings.warn('tesserocr is not installed, every OCR call starts the tesseract '
+                          'program through pytesseract', RuntimeWarning, stacklevel=2)
+        # a tesseract API object can only work on one image at a time. Threads check one
+        # out of the idle queue and put it back when done; at most max_apis are ever
+        # made, however many short-lived thread pools come and go, and a thread finding
+        # none idle once they are all made waits for one
+        self.max_apis = max_apis or os.cpu_count() or 1
+        self._idle = queue.LifoQueue()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return 'tesserocr' if self.use_tesserocr else 'pytesseract'
+
+    #lend an idle API object for the body of a with statement, making one if none is
+    #idle and fewer than max_apis exist. The API objects are shared, so the page
+    #segmentation mode is set on every loan
+    @contextlib.contextmanager
+    def _api(self, psm=None):
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            api = None
+            with self._lock:
+                if len(self._apis) < self.max_apis:
+                    api = tesserocr.PyTessBaseAPI(lang=self.lang)
+                    self._apis.append(api)
+            if api is None:
+                api = self._idle.get()
+        try:
+            api.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+            yield api
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def _set_image(self, api, image):
+        if isinstance(image, np.ndarray):
+            image = np.ascontiguousarray(image)
+            height, width = image.shape[:2]
+            channels = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height, channels, width*channels)
+        else:
+            if image.mode not in ('L', 'RGB', 'RGBA'):
+                image = image.convert('RGB')
+            api.SetImage(image)
+
+    #OCR a PIL image or a numpy array (greyscale or RGB) and return the text. psm is a
+    #tesseract page segmentation mode, tesseract's default (3, automatic) if None
+    def image_to_string(self, image, psm=None):
+        if not self.use_tesserocr:
+            config = '--psm {}'.format(psm) if psm is not None else ''
+            return pytesseract.image_to_string(image, lang=self.lang, config=config)
+        with self._api(psm) as api:
+            self._set_image(api, image)
+            return api.GetUTF8Text()
+
+    #OCR an image and return its words as dicts with the word 'text', its 'left', 'top',
+    #'width' and 'height' in image pixels, the 'conf'idence, and a 'line' number which
+    #is the same for the words of one line of text
+    def image_to_words(self, image):
+        if not self.use_tesserocr:
+            data = pytesseract.image_to_data(image, lang=self.lang,
+                                             output_type=pytesseract.Output.DICT)
+            words = []
+            lines = {}
+            for i, text in enumerate(data['text']):
+                if not text.strip():
+                    continue
+                line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+                words.append({'text':text, 'left':data['left'][i], 'top':data['top'][i],
+                              'width':data['width'][i], 'height':data['height'][i],
+                              'conf':float(data['conf'][i]),
+                              'line':lines.setdefault(line, len(lines))})
+            return words
+        with self._api() as api:
+            self._set_image(api, image)
+            api.Recognize()
+            words = []
+            line = -1
+            iterator = api.GetIterator()
+            for word in tesserocr.iterate_level(iterator, tesserocr.RIL.WORD):
+                if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                text = word.GetUTF8Text(tesserocr.RIL.WORD)
+                box = word.BoundingBox(tesserocr.RIL.WORD)
+                if not text or not text.strip() or box is None:
+                    continue
+                x0, y0, x1, y1 = box
+                words.append({'text':text, 'left':x0, 'top':y0, 'width':x1 - x0,
+                              'height':y1 - y0, 'conf':word.Confidence(tesserocr.RIL.WORD),
+                              'line':max(line, 0)})
+            return words
+
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
+            self._idle = queue.LifoQueue()
+
+
+_engine = None
+_engine_pid = None
+
+
+#the engine shared by everything in this process. A forked pool worker must not reuse
+#its parent's tesseract objects, so a new engine is made when the process id changes
+def get_engine():
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = OcrEngine()
+        _engine_pid = os.getpid()
+    return _engine
+
+
+#OCR a large page as overlapping horizontal bands, side by side on a thread pool, and
+#stitch the words back together. Every band owns the rows between its cut lines and
+#reaches overlap pixels past them on both sides, so a line of text cut by a band edge is
+#still whole in the band that owns its middle. Each word is kept only by the band owning
+#its vertical centre, which drops the copies read in the overlaps. Returns the text of
+#the page and its words, with positions in page pixels
+def ocr_in_bands(image, bands=None, overlap=64, engine=None):
+    engine = engine or get_engine()
+    image = np.asarray(image)
+    height = image.shape[0]
+    bands = bands or os.cpu_count() or 1
+    bands = max(min(bands, height // (2*overlap) or 1), 1)
+    step = math.ceil(height/bands)
+    cuts = [(top, min(top + step, height)) for top in range(0, height, step)]
+
+    def read_band(cut):
+        top, bottom = cut
+        first = max(top - overlap, 0)
+        words = engine.image_to_words(image[first:min(bottom + overlap, height)])
+        kept = []
+        for word in words:
+            word['top'] += first
+            if top <= word['top'] + word['height']/2 < bottom:
+                kept.append(word)
+        return kept
+
+    if len(cuts) == 1:
+        results = [read_band(cuts[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(cuts)) as pool:
+            results = list(pool.map(read_band, cuts))
+    words = []
+    lines = []
+    for band, band_words in enumerate(results):
+        line_words = {}
+        for word in band_words:
+            line_words.setdefault(word['line'], []).append(word)
+        for number in sorted(line_words):
+            lines.append(' '.join(word['text'] for word in line_words[number]))
+            for word in line_words[number]:
+                word['line'] = len(lines) - 1
+                words.append(word)
+    return '\n'.join(lines), words
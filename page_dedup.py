@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Finding the pages of an archive that are the same page again: reprints, re-scans, the
+# same advert on many days. Only the first page of a group goes through process_page;
+# the others get a copy of its text and faces. There are two kinds of match:
+#   'crc'     the very same file stored twice. The CRC and size of every entry are in
+#             the central directory, so these are grouped without decoding anything
+#   'pixels'  near-identical pages, e.g. the same page re-encoded. Every page is first
+#             reduced to a 64 bit perceptual hash of a small greyscale copy (JPEG decodes
+#             straight to an eighth of its size; other formats are decoded in full and
+#             then shrunk, which costs about as much as decoding the page). A hash of a
+#             whole page only sees its layout, not its text: pages with the same columns
+#             and photo but different words often hash within a couple of bits of each
+#             other, or to the very same hash. So a hash match only makes two pages
+#             candidates, and they are grouped once both, decoded in full, have the same
+#             size and at most max_changed of their pixels differ by more than
+#             PIXEL_TOLERANCE grey levels
+#
+#   dedup = PageDeduplicator(max_distance=4, confirm='pixels')
+#   results = dict(page_pipeline.ingest(ARCHIVE_PATH, dedup=dedup))
+#   print(dedup.report())
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+import cv2 as cv
+import numpy as np
+
+from page_pipeline import Page
+
+PIXEL_TOLERANCE = 48
+
+
+#difference hash: shrink to 9x8 and keep whether each pixel is brighter than its left
+#neighbour. Cheap, and robust to changes of brightness, contrast and scale
+def dhash(img_g):
+    small = cv.resize(img_g, (9, 8), interpolation=cv.INTER_AREA).astype(np.int16)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+#DCT hash: the 8x8 lowest frequencies of a 32x32 copy, compared against their median.
+#Slower than dhash but less sensitive to noise and small shifts
+def phash(img_g):
+    small = cv.resize(img_g, (32, 32), interpolation=cv.INTER_AREA).astype(np.float32)
+    low = cv.dct(small)[:8, :8]
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+HASHES = {'dhash':dhash, 'phash':phash}
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+#an entry decoded to greyscale at an eighth of its size. JPEG decodes straight to the
+#small size, which is much less work than decoding the page; PNG is decoded in full
+def _small_grey(data):
+    img_g = cv.imdecode(np.frombuffer(data, np.uint8), cv.IMREAD_REDUCED_GRAYSCALE_8)
+    if img_g is None:
+        image = Image.open(io.BytesIO(data))
+        image.draft('L', (image.width//8, image.height//8))
+        image = image.convert('L')
+        image = image.resize((max(image.width//8, 1), max(image.height//8, 1)))
+        img_g = np.asarray(image)
+    return img_g
+
+
+class PageDeduplicator:
+    def __init__(self, max_distance=4, method='dhash', confirm='crc', max_changed=0.001,
+                 threads=4):
+        if confirm not in ('crc', 'pixels'):
+            raise ValueError('confirm must be crc or pixels, not {!r}'.format(confirm))
+        self.max_distance = max_distance
+        self.method = method
+        self.confirm = confirm
+        self.max_changed = max_changed
+        self.threads = threads
+        # page name -> its hash ('pixels' only), and duplicate page name -> the first
+        # page of its group
+        self.hashes = {}
+        self.duplicate_of = {}
+        # first page -> the other pages of its group
+        self.groups = {}
+        self.pages = 0
+        # hash matches that turned out to be different pages
+        self.rejected = 0
+        self.group_s = 0.0
+        self.processing_s = 0.0
+        self.processed = 0
+
+    #group the named entries of an archive_reader.ArchiveReader. Returns the names that
+    #need processing: the first page of every group, in archive order
+    def group(self, archive, names):
+        started = time.perf_counter()
+        if self.confirm == 'crc':
+            unique = self._group_files(archive, names)
+        else:
+            unique = self._group_pixels(archive, names)
+        self.pages += len(names)
+        self.group_s += time.perf_counter() - started
+        return unique
+
+    def _add(self, name, leader, unique):
+        if leader is None:
+            self.groups[name] = []
+            unique.append(name)
+        else:
+            self.duplicate_of[name] = leader
+            self.groups[leader].append(name)
+
+    def _group_files(self, archive, names):
+        leaders = {}
+        unique = []
+        for name in names:
+            info = archive.infos[name]
+            key = (info.CRC, info.file_size)
+            self._add(name, leaders.get(key), unique)
+            leaders.setdefault(key, name)
+        return unique
+
+    def _group_pixels(self, archive, names):
+        hash_page = HASHES[self.method]
+
+        def page_key(name):
+            small = _small_grey(archive.read(name))
+            return name, small.shape, hash_page(small)
+        # leaders by decoded size, as parallel lists of names and hashes
+        leaders = {}
+        unique = []
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for name, shape, page_hash in pool.map(page_key, names):
+                self.hashes[name] = page_hash
+                leader_names, leader_hashes = leaders.setdefault(shape, ([], []))
+                match = None
+                for leader, leader_hash in zip(leader_names, leader_hashes):
+                    if hamming(page_hash, leader_hash) > self.max_distance:
+                        continue
+                    if self._same_pixels(archive, leader, name):
+                        match = leader
+                        break
+                    self.rejected += 1
+                self._add(name, match, unique)
+                if match is None:
+                    leader_names.append(name)
+                    leader_hashes.append(page_hash)
+        return unique
+
+    def _same_pixels(self, archive, a, b):
+        grey_a = Page.from_archive(archive, a).grey
+        grey_b = Page.from_archive(archive, b).grey
+        if grey_a.shape != grey_b.shape:
+            return False
+        changed = cv.countNonZero(cv.threshold(cv.absdiff(grey_a, grey_b), PIXEL_TOLERANCE,
+                                               255, cv.THRESH_BINARY)[1])
+        return changed <= self.max_changed*grey_a.size
+
+    def duplicates(self, img_name):
+        return self.groups.get(img_name, [])
+
+    #record how long processing the unique pages took, to estimate the time saved
+    def add_processing_time(self, seconds, pages):
+        self.processing_s += seconds
+        self.processed += pages
+
+    #which kind of match was used, how many pages were looked at, how many were
+    #processed, how many were copies and how many hash matches were rejected as
+    #different pages, with the time spent grouping and an estimate of the processing
+    #time the copies would have taken at the average speed of the processed pages
+    def report(self):
+        duplicates = len(self.duplicate_of)
+        per_page = self.processing_s/self.processed if self.processed else 0.0
+        return {'match':self.confirm, 'pages':self.pages, 'processed':self.pages - duplicates,
+                'duplicates':duplicates,
+                'groups':sum(1 for members in self.groups.values() if members),
+                'rejected':self.rejected,
+                'group_s':self.group_s, 'processing_s':self.processing_s,
+                'saved_s_estimate':duplicates*per_page}
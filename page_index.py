@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# A persistent index of processed newspaper pages. The archives never change, so there
+# is no reason to run tesseract and the cascade over the same page twice: every result
+# of page_pipeline.process_page is stored in a SQLite file, keyed by the entry name,
+# its CRC and size in the ZIP central directory, and the detector parameters.
+# Only the text and the face boxes are stored; thumbnails are cut when they are shown.
+
+import json
+import sqlite3
+
+# bumped whenever the tables change; a file with another version is rebuilt from scratch
+SCHEMA_VERSION = 2
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    crc INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (name, crc, size, params)
+);
+CREATE TABLE IF NOT EXISTS faces (
+    page_id INTEGER NOT NULL REFERENCES pages(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    w INTEGER NOT NULL,
+    h INTEGER NOT NULL,
+    PRIMARY KEY (page_id, position)
+);
+'''
+
+
+#the parameters are part of the key, so they have to serialize the same way every time
+def params_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+class PageIndex:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version != SCHEMA_VERSION:
+            self.connection.executescript('DROP TABLE IF EXISTS faces; DROP TABLE IF EXISTS pages;')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    #return the stored result for a ZipInfo entry, or None if the page is new, changed
+    #or was processed with different parameters
+    def lookup(self, entry, params):
+        row = self.connection.execute(
+            'SELECT id, text FROM pages WHERE name = ? AND crc = ? AND size = ? AND params = ?',
+            (entry.filename, entry.CRC, entry.file_size, params_key(params))).fetchone()
+        if row is None:
+            return None
+        page_id, text = row
+        faces = self.connection.execute(
+            'SELECT x, y, w, h FROM faces WHERE page_id = ? ORDER BY position',
+            (page_id,)).fetchall()
+        return {'text':text, 'boxes':faces}
+
+    #store a page result. An older version of the same entry processed with the same
+    #parameters is replaced, so changed pages don't pile up in the file
+    def store(self, entry, params, result):
+        key = params_key(params)
+        self.connection.execute('DELETE FROM pages WHERE name = ? AND params = ?',
+                                (entry.filename, key))
+        cursor = self.connection.execute(
+            'INSERT INTO pages (name, crc, size, params, text) VALUES (?, ?, ?, ?, ?)',
+            (entry.filename, entry.CRC, entry.file_size, key, result['text']))
+        self.connection.executemany(
+            'INSERT INTO faces (page_id, position, x, y, w, h) VALUES (?, ?, ?, ?, ?, ?)',
+            [(cursor.lastrowid, position, x, y, w, h)
+             for position, (x, y, w, h) in enumerate(result['boxes'])])
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
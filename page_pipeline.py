@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Page processing for the newspaper search project. These functions live in their own
+# module rather than in the notebook so that a process pool can import them in its
+# workers - a function defined inside a notebook cell can't be pickled under the
+# "spawn" start method used on macOS and Windows.
+
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+import cv2 as cv
+import numpy as np
+
+import ocr_engine
+from archive_reader import ArchiveReader
+from tracing import NULL_TRACER, PageTracer
+
+CASCADE_PATH = 'readonly/haarcascade_frontalface_default.xml'
+# everything that changes the result of process_page. The persistent page index keys
+# its entries on these too, so changing one of them invalidates the cached pages.
+# ocr_mode is 'page' to OCR the whole page, 'blocks' to OCR only the text blocks found
+# by find_text_blocks, 'bands' to OCR the page as overlapping horizontal bands side by
+# side (ocr_engine.ocr_in_bands), or 'none' to only look for faces. The face settings
+# are described at detect_faces
+DETECTOR_PARAMS = {'scale_factor':1.3, 'min_neighbors':5, 'ocr_mode':'page',
+                   'detect_scale':1.0, 'min_face_size':None, 'max_face_size':None,
+                   'verify_faces':False}
+
+# per-process state, filled lazily in the parent and by _init_worker in the pool
+_face_cascade = None
+_archive = None
+_params = DETECTOR_PARAMS
+_trace = False
+# threads used to OCR the text blocks of one page. Pool workers already run one page
+# per core, so they use a single thread
+_ocr_threads = os.cpu_count() or 1
+
+
+def face_cascade():
+    # loading the face detection classifier once per process
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv.CascadeClassifier(CASCADE_PATH)
+    return _face_cascade
+
+
+#find the faces of a greyscale page and return their (x,y,w,h) boxes in page pixels.
+#Newspaper pages are far bigger than needed to find a thumbnail sized face, so the
+#cascade can run on a copy shrunk by detect_scale, with the boxes scaled back up.
+#min_size and max_size are (w,h) in page pixels and keep the cascade away from scales
+#where no face can be. With verify, the small copy is searched with fewer neighbours so
+#faces aren't missed, and every candidate is then searched for again at full resolution
+#with the caller's scale_factor and min_neighbors (see _verify_face)
+def detect_faces(img_g, scale_factor=1.3, min_neighbors=5, detect_scale=1.0,
+                 min_size=None, max_size=None, verify=False):
+    small = img_g
+    if detect_scale != 1.0:
+        small = cv.resize(img_g, None, fx=detect_scale, fy=detect_scale,
+                          interpolation=cv.INTER_AREA)
+    options = {}
+    if min_size:
+        options['minSize'] = tuple(max(int(side*detect_scale), 1) for side in min_size)
+    if max_size:
+        options['maxSize'] = tuple(int(side*detect_scale) for side in max_size)
+    neighbors = max(min_neighbors - 2, 1) if verify else min_neighbors
+    candidates = face_cascade().detectMultiScale(small, scale_factor, neighbors, **options)
+    boxes = [tuple(int(round(value/detect_scale)) for value in box) for box in candidates]
+    if verify:
+        verified = (_verify_face(img_g, box, scale_factor, min_neighbors) for box in boxes)
+        boxes = [box for box in verified if box is not None]
+    return boxes
+
+
+#search the area around a candidate box with the same settings a full resolution search
+#uses, and return the face found there that covers most of the candidate (at least half
+#of the two boxes together), in page pixels, or None. So a candidate only stays if the
+#original cascade settings find it too, and it comes back as the box they find
+def _verify_face(img_g, box, scale_factor, min_neighbors):
+    x, y, w, h = box
+    margin_x, margin_y = w//2, h//2
+    x0, y0 = max(x - margin_x, 0), max(y - margin_y, 0)
+    region = img_g[y0:y + h + margin_y, x0:x + w + margin_x]
+    found = face_cascade().detectMultiScale(region, scale_factor, min_neighbors)
+    best, best_overlap = None, 0.5
+    for fx, fy, fw, fh in found:
+        candidate = (int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+        overlap = _iou(candidate, box)
+        if overlap >= best_overlap:
+            best, best_overlap = candidate, overlap
+    return best
+
+
+#intersection over union of two (x,y,w,h) boxes
+def _iou(a, b):
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width*height
+    return inter/(a[2]*a[3] + b[2]*b[3] - inter)
+
+
+#a page of the archive. The entry is decoded once, straight to a single greyscale numpy
+#buffer, which OpenCV and the OCR engine both read without copying it into other image
+#types. Colour is only needed for the face thumbnails, so it is decoded on demand by
+#rgb_crop(), and only for pages that have faces. Both are decoded on first use
+class Page:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self._grey = None
+        self._rgb = None
+
+    @property
+    def grey(self):
+        if self._grey is None:
+            self._grey = cv.imdecode(np.frombuffer(self.data, np.uint8), cv.IMREAD_GRAYSCALE)
+            if self._grey is None:
+                # a format OpenCV can't read, let pillow have a go
+                self._grey = np.asarray(Image.open(io.BytesIO(self.data)).convert('L'))
+        return self._grey
+
+    #archive is an archive_reader.ArchiveReader or a zipfile.ZipFile
+    @classmethod
+    def from_archive(cls, archive, name):
+        return cls(name, archive.read(name))
+
+    @property
+    def size(self):
+        return self.grey.shape[1], self.grey.shape[0]
+
+    #the (x,y,w,h) area of the page as an RGB PIL image
+    def rgb_crop(self, box):
+        if self._rgb is None:
+            self._rgb = Image.open(io.BytesIO(self.data)).convert('RGB')
+        x, y, w, h = box
+        return self._rgb.crop((x, y, x + w, y + h))
+
+    #drop the colour copy once all the crops are taken
+    def release(self):
+        self._rgb = None
+
+
+#find the candidate text blocks of a greyscale page and return their (x,y,w,h) boxes in
+#reading order. Letters have strong edges, so we take the morphological gradient,
+#binarize it and smear it with a join sized kernel until the words of a line run
+#together. Blocks that overlap one of exclude_boxes (the faces) are dropped. So are
+#photos: printed text is dense with edges and almost free of mid-grey pixels, while a
+#photo has few sharp edges and lots of mid-grey. The lines left are then merged into
+#column blocks (see _merge_lines), so tesseract gets a few large blocks rather than
+#one call per line
+def find_text_blocks(img_g, exclude_boxes=(), join=(30, 15), min_height=8,
+                     min_edges=0.1, max_midtones=0.3, padding=4, merge_gap=1.5):
+    gradient = cv.morphologyEx(img_g, cv.MORPH_GRADIENT,
+                               cv.getStructuringElement(cv.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv.threshold(gradient, 0, 255, cv.THRESH_BINARY | cv.THRESH_OTSU)
+    joined = cv.morphologyEx(edges, cv.MORPH_CLOSE, cv.getStructuringElement(cv.MORPH_RECT, join))
+    contours, _ = cv.findContours(joined, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    height, width = img_g.shape[:2]
+    blocks = []
+    for contour in contours:
+        x, y, w, h = cv.boundingRect(contour)
+        if h < min_height or w < 2*min_height:
+            continue
+        if any(_overlaps((x, y, w, h), box) for box in exclude_boxes):
+            continue
+        if cv.countNonZero(edges[y:y+h, x:x+w]) < min_edges*w*h:
+            continue
+        region = img_g[y:y+h, x:x+w]
+        if cv.countNonZero(cv.inRange(region, 64, 191)) > max_midtones*w*h:
+            continue
+        x0, y0 = max(x - padding, 0), max(y - padding, 0)
+        x1, y1 = min(x + w + padding, width), min(y + h + padding, height)
+        blocks.append((x0, y0, x1 - x0, y1 - y0))
+    if merge_gap:
+        blocks = _merge_lines(blocks, merge_gap, exclude_boxes)
+    return sorted(blocks, key=lambda box: (box[1], box[0]))
+
+
+#merge text boxes into column blocks: a box joins a block above it when the two overlap
+#horizontally and the gap between them is at most gap times the height of the box,
+#unless the merged block would run into one of exclude_boxes. Repeated until nothing
+#merges any more, as a merged block can reach boxes none of its parts did
+def _merge_lines(boxes, gap, exclude_boxes=()):
+    boxes = sorted(boxes, key=lambda box: (box[1], box[0]))
+    merged = True
+    while merged:
+        merged = False
+        blocks = []
+        for box in boxes:
+            x, y, w, h = box
+            for i, (bx, by, bw, bh) in enumerate(blocks):
+                if x >= bx + bw or bx >= x + w:
+                    continue
+                if y - (by + bh) > gap*h:
+                    continue
+                x0, y0 = min(x, bx), min(y, by)
+                union = (x0, y0, max(x + w, bx + bw) - x0, max(y + h, by + bh) - y0)
+                if any(_overlaps(union, face) for face in exclude_boxes):
+                    continue
+                blocks[i] = union
+                merged = True
+                break
+            else:
+                blocks.append(box)
+        boxes = blocks
+    return boxes
+
+
+def _overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+# every text block is one column of text, so tesseract is told so with page
+# segmentation mode 6 instead of looking for a page layout in it
+BLOCK_PSM = 6
+
+
+#OCR only the given blocks of a page, side by side on a thread pool (tesseract does the
+#work outside of python's lock), and join their text in reading order
+def ocr_blocks(img_g, blocks, threads=None):
+    engine = ocr_engine.get_engine()
+    crops = [img_g[y:y+h, x:x+w] for x, y, w, h in blocks]
+    threads = threads or _ocr_threads
+    if threads == 1 or len(crops) < 2:
+        texts = [engine.image_to_string(crop, psm=BLOCK_PSM) for crop in crops]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            texts = list(pool.map(lambda crop: engine.image_to_string(crop, psm=BLOCK_PSM),
+                                  crops))
+    return '\n'.join(text.strip() for text in texts if text.strip())
+
+
+#parse the text of a Page and find the bounding boxes of all its faces. Only compact
+#results come back: the text and the (x,y,w,h) face boxes. The thumbnails are cut from
+#the page later, and only for the faces a search actually shows (see thumbnails.py).
+#Every stage is timed through tracer (see tracing.py)
+def process_page(page, params=None, tracer=NULL_TRACER):
+    params = params or _params
+    with tracer.stage(page.name, 'decode'):
+        img_g = page.grey
+    with tracer.stage(page.name, 'faces'):
+        boxes = detect_faces(
+            img_g, params['scale_factor'], params['min_neighbors'], params['detect_scale'],
+            params['min_face_size'], params['max_face_size'], params['verify_faces'])
+    if params['ocr_mode'] == 'blocks':
+        with tracer.stage(page.name, 'text_blocks'):
+            blocks = find_text_blocks(img_g, exclude_boxes=boxes)
+        with tracer.stage(page.name, 'ocr'):
+            text = ocr_blocks(img_g, blocks)
+    elif params['ocr_mode'] == 'none':
+        text = ''
+    elif params['ocr_mode'] == 'bands':
+        with tracer.stage(page.name, 'ocr'):
+            text, _ = ocr_engine.ocr_in_bands(img_g, bands=_ocr_threads)
+    else:
+        with tracer.stage(page.name, 'ocr'):
+            text = ocr_engine.get_engine().image_to_string(img_g)
+    if tracer.enabled:
+        tracer.annotate(page.name, width=img_g.shape[1], height=img_g.shape[0],
+                        faces=len(boxes), chars=len(text))
+    return {'text':text, 'boxes':boxes}
+
+
+#read an entry and process it, timing the read too
+def _process_archive_entry(archive, entry_name, params, tracer):
+    with tracer.stage(entry_name, 'read'):
+        page = Page.from_archive(archive, entry_name)
+    return process_page(page, params, tracer)
+
+
+def _init_worker(archive_path, params, trace):
+    global _archive, _params, _ocr_threads, _trace
+    _params = params
+    _trace = trace
+    _ocr_threads = 1
+    # tesseract and OpenCV both start their own thread pools. With one page per core
+    # already running, those threads just fight each other, so pin them to one
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    cv.setNumThreads(1)
+    face_cascade()
+    # every worker opens its own handle on the archive
+    _archive = ArchiveReader(archive_path)
+
+
+def _process_entry(entry_name):
+    if not _trace:
+        return _process_archive_entry(_archive, entry_name, _params, NULL_TRACER)
+    # the parent can't see our tracer, so the page's record travels back with the result
+    tracer = PageTracer()
+    result = _process_archive_entry(_archive, entry_name, _params, tracer)
+    result['trace'] = tracer.records.get(entry_name, {})
+    return result
+
+
+#run every page of the archive through process_page and yield (name, result) pairs, in
+#archive order. With workers=1 the pages are streamed in this process; otherwise each worker of a
+#process pool gets an entry name, decodes the page itself and only sends back the
+#compact result. If an index is given, entries it already holds are answered from it
+#and only new or changed entries are processed (and then added to it). params defaults
+#to DETECTOR_PARAMS. A tracing.PageTracer given as tracer records the timings of every
+#processed page, wherever it ran. pattern, min_size and max_size pick a subset of the
+#entries by name and size (see ArchiveReader.entries) before anything is decoded. With
+#a page_dedup.PageDeduplicator as dedup, repeated pages are only processed once and the
+#others of their group are given a copy of the result. The copies are not stored in
+#the index, so a later run without dedup processes those pages for real
+def ingest(archive_path, workers=None, index=None, params=None, tracer=None,
+           pattern=None, min_size=None, max_size=None, dedup=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if params is None:
+        params = DETECTOR_PARAMS
+    if tracer is None:
+        tracer = NULL_TRACER
+    with ArchiveReader(archive_path) as archive:
+        entries = archive.entries(pattern, min_size, max_size)
+    cached = {}
+    pending = {}
+    for entry in entries:
+        result = index.lookup(entry, params) if index is not None else None
+        if result is None:
+            pending[entry.filename] = entry
+        else:
+            cached[entry.filename] = result
+    names = list(pending)
+    if dedup is not None and names:
+        with ArchiveReader(archive_path) as archive:
+            names = dedup.group(archive, names)
+    started = time.perf_counter()
+    processed = _process_entries(archive_path, names, workers, params, tracer)
+    try:
+        # results are yielded in archive order whatever the index held. The pool hands the
+        # processed pages back in archive order too, so only the pages between two
+        # processed ones (and the copies of a duplicate page) wait in ready
+        ready = {}
+        for entry in entries:
+            img_name = entry.filename
+            if img_name in cached:
+                yield img_name, cached.pop(img_name)
+                continue
+            while img_name not in ready:
+                done, result = next(processed)
+                if 'trace' in result:
+                    tracer.merge(done, result.pop('trace'))
+                if index is not None:
+                    index.store(pending[done], params, result)
+                ready[done] = result
+                for duplicate in (dedup.duplicates(done) if dedup is not None else ()):
+                    ready[duplicate] = {'text':result['text'], 'boxes':list(result['boxes'])}
+            yield img_name, ready.pop(img_name)
+    finally:
+        processed.close()
+    if dedup is not None:
+        dedup.add_processing_time(time.perf_counter() - started, len(names))
+    if index is not None:
+        index.commit()
+
+
+def _process_entries(archive_path, names, workers, params, tracer):
+    if not names:
+        return
+    if workers == 1:
+        with ArchiveReader(archive_path) as archive:
+            for img_name in names:
+                yield img_name, _process_archive_entry(archive, img_name, params, tracer)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(archive_path, params, tracer.enabled))
+    try:
+        for img_name, result in zip(names, pool.map(_process_entry, names)):
+            yield img_name, result
+    finally:
+        # when the caller stops early or an error comes up, only wait for the pages
+        # already being worked on, not for the rest of the archive
+        pool.shutdown(wait=True, cancel_futures=True)
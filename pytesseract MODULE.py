@@ -251,31 +251,78 @@ def binarize(image_to_transform, threshold):
     # the algorithm for the binarization is pretty simple, go through every pixel in the
     # image and, if it's greater than the threshold, turn it all the way up (255), and
     # if it's lower than the threshold, turn it all the way down (0).
-    # so lets write this in code. First, we need to iterate over all of the pixels in the
-    # image we want to work with
-    for x in range(output_image.width):
-        for y in range(output_image.height):
-            # for the given pixel at w,h, lets check its value against the threshold
-            if output_image.getpixel((x,y))< threshold: #note that the first parameter is actually a tuple object
-                # lets set this to zero
-                output_image.putpixel( (x,y), 0 )
-            else:
-                # otherwise lets set this to 255
-                output_image.putpixel( (x,y), 255 )
+    # We could write this as two loops over x and y calling getpixel() and putpixel(),
+    # but that is millions of python calls for a newspaper sized image. A greyscale pixel
+    # can only have 256 different values though, so instead we work out the answer once
+    # for each of those values and hand this lookup table to point(), which applies it
+    # to every pixel in one go inside of pillow
+    table=[0 if value < threshold else 255 for value in range(256)]
     #now we just return the new image
-    return output_image
+    return output_image.point(table)
+
+# If we want to try several thresholds, we can do even better and binarize for all of them
+# in one pass over the greyscale data. numpy compares the whole image against every
+# threshold at once - the thresholds become an extra first dimension of the result. The
+# comparison gives True/False (one byte each), and multiplying by a one byte 255 keeps it
+# at one byte per pixel per threshold, rather than numpy's default of eight
+import numpy as np
+def binarize_many(image_to_transform, thresholds):
+    grey=np.asarray(image_to_transform.convert("L"))
+    thresholds=np.asarray(list(thresholds)).reshape(-1, 1, 1)
+    stack=(grey >= thresholds).astype(np.uint8)*np.uint8(255)
+    return [Image.fromarray(binarized) for binarized in stack]
 
 # lets test this function over a range of different thresholds. Remember that you can use
 # the range() function to generate a list of numbers at different step sizes. range() is called
 # with a start, a stop, and a step size. So lets try range(0, 257, 64), which should generate 5
 # images of different threshold values
-for thresh in range(0,257,64):
+thresholds=range(0,257,64)
+for thresh, binarized in zip(thresholds, binarize_many(Image.open('readonly/Noisy_OCR.PNG'), thresholds)):
     print("Trying with threshold " + str(thresh))
     # Lets display the binarized image inline
-    display(binarize(Image.open('readonly/Noisy_OCR.PNG'), thresh))
-    # And lets use tesseract on it. It's inefficient to binarize it twice but this is just for
-    # a demo
-    print(pytesseract.image_to_string(binarize(Image.open('readonly/Noisy_OCR.PNG'), thresh)))
+    display(binarized)
+    # And lets use tesseract on it
+    print(pytesseract.image_to_string(binarized))
+
+
+# In[ ]:
+
+
+# Trying thresholds one after another means one OCR call for each of them. But the image
+# itself can tell us a good threshold before we run tesseract at all. Count how many
+# pixels there are of each grey value - the histogram - and for text on a background
+# there are two humps in it, one for the ink and one for the paper. Otsu's method tries
+# every possible split of the histogram into a dark and a light group and picks the one
+# where the two groups are as far apart as possible compared to how spread out they are.
+# OpenCV, which we will meet properly in the next module, has it built in: threshold()
+# with the THRESH_OTSU flag works the split out from the histogram and hands it back.
+# It turns the pixels at or below the split black, so for our binarize function, which
+# turns the pixels below the threshold black, that is a threshold one higher. An image
+# of a single colour has no split to find; OpenCV then answers 0 rather than failing
+import cv2 as cv
+def otsu_threshold(image_to_transform):
+    grey=np.asarray(image_to_transform.convert("L"))
+    split, _=cv.threshold(grey, 0, 255, cv.THRESH_BINARY+cv.THRESH_OTSU)
+    return int(split)+1
+
+# A single threshold for the whole image struggles when the lighting changes across it,
+# like in a photograph. An adaptive threshold compares every pixel to the average of the
+# pixels around it instead. Here is a binarize which picks the threshold by itself, with
+# either method
+def binarize_auto(image_to_transform, method="otsu", block_size=31, offset=10):
+    grey=np.asarray(image_to_transform.convert("L"))
+    if method=="adaptive":
+        binarized=cv.adaptiveThreshold(grey, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv.THRESH_BINARY, block_size, offset)
+    else:
+        _, binarized=cv.threshold(grey, 0, 255, cv.THRESH_BINARY+cv.THRESH_OTSU)
+    return Image.fromarray(binarized)
+
+# so instead of five OCR calls, lets estimate the threshold and OCR just once
+noisy=Image.open('readonly/Noisy_OCR.PNG')
+print("Otsu picked a threshold of " + str(otsu_threshold(noisy)))
+display(binarize_auto(noisy))
+print(pytesseract.image_to_string(binarize_auto(noisy)))
 
 
 # In[ ]:
@@ -403,13 +450,8 @@ pytesseract.image_to_string(bigger_sign)
 # binarization code we did earlier
 def binarize(image_to_transform, threshold):
     output_image=image_to_transform.convert("L")
-    for x in range(output_image.width):
-        for y in range(output_image.height):
-            if output_image.getpixel((x,y))< threshold:
-                output_image.putpixel( (x,y), 0 )
-            else:
-                output_image.putpixel( (x,y), 255 )
-    return output_image
+    table=[0 if value < threshold else 255 for value in range(256)]
+    return output_image.point(table)
 
 # Now, lets apply binarizations with, say, a threshold of 190, and try and display that
 # as well as do the OCR work
@@ -428,35 +470,80 @@ pytesseract.image_to_string(binarized_bigger_sign)
 # any english words in that list, this might be one way. So lets see if we can
 # write a routine to do this.
 #
-# First, lets load a list of english words into a list. I put a copy in the readonly
-# directory for you to work with
-eng_dict=[]
-with open ("readonly/words_alpha.txt", "r") as f:
-    data=f.read()
-    # now we want to split this into a list based on the new line characters
-    eng_dict=data.split("\n")
-
-# Now lets iterate through all possible thresholds and look for an english word, printing
-# it out if it exists
-for i in range(150,170):
-    # lets binarize and convert this to s tring values
-    strng=pytesseract.image_to_string(binarize(bigger_sign,i))
-    # We want to remove non alphabetical characters, like ([%$]) from the text, here's
-    # a short method to do that
-    # first, lets convert our string to lower case only
-    strng=strng.lower()
-    # then lets import the string package - it has a nice list of lower case letters
-    import string
-    # now lets iterate over our string looking at it character by character, putting it in
-    # the comaprison text
-    comparison=''
-    for character in strng:
-        if character in string.ascii_lowercase:
-            comparison=comparison+character
-    # finally, lets search for comparison in the dictionary file
-    if comparison in eng_dict:
-        # and print it if we find it
-        print(comparison)
+# First, lets load the list of english words. I put a copy in the readonly directory for
+# you to work with. We are going to ask "is this word in the list?" a lot, and for a python
+# list that means comparing against every one of the ~370,000 words in turn. A set answers
+# the same question with a single hash lookup, so the load_dictionary function in the
+# dictionary module next to this notebook loads the words into a frozenset (a set which
+# can't be changed afterwards), and remembers it so the file is only read the first time.
+#
+# The same module has a clean_ocr_text function, which lower cases the text tesseract
+# gives us back and drops anything that isn't a letter, like ([%$]), and a dictionary_word
+# function which hands back the cleaned up word if it is an english word, and None if not.
+# Lets bring those in
+from dictionary import load_dictionary, clean_ocr_text, dictionary_word
+
+eng_dict=load_dictionary()
+
+
+# In[ ]:
+
+
+# We could now go through the thresholds one after another, but every call to tesseract
+# takes a while, so trying twenty thresholds takes twenty times as long. Instead, lets
+# binarize for all of the thresholds at once, hand the OCR work to a pool of workers
+# and stop as soon as one of them comes back with an english word. Threads are fine
+# here: pytesseract runs the tesseract program in its own process, so the workers
+# really do run side by side.
+#
+# Starting tesseract for every threshold means loading its language models from disk
+# every time too. The ocr_engine module next to this notebook keeps tesseract loaded
+# between calls when the tesserocr package is installed (one copy per worker thread,
+# and tesserocr releases python's lock while it works, so threads still run side by side),
+# and falls back to pytesseract when it isn't, so lets use that for the sweep.
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import ocr_engine
+ocr=ocr_engine.get_engine()
+
+def sweep_thresholds(image, thresholds, is_valid, workers=4):
+    thresholds=list(thresholds)
+    pool=ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures={pool.submit(ocr.image_to_string, binarized): threshold
+                 for threshold, binarized in zip(thresholds, binarize_many(image, thresholds))}
+        for future in as_completed(futures):
+            text=future.result()
+            if is_valid(text):
+                # we have a winner, so lets report which threshold it was
+                return futures[future], text
+        return None, None
+    finally:
+        # and throw away all the thresholds which haven't been tried yet
+        pool.shutdown(wait=False, cancel_futures=True)
+
+threshold, text=sweep_thresholds(bigger_sign, range(150,170), dictionary_word)
+print("Threshold {} gave us {}".format(threshold, dictionary_word(text) if text else None))
+
+
+# In[ ]:
+
+
+# That was twenty thresholds that we picked by looking at the image ourselves. With
+# otsu_threshold we can let the image suggest where to look: first OCR with the estimate
+# alone, and only if that doesn't give us a word, sweep a narrow window around it, the
+# closest thresholds first. Most of the time that is one or two OCR calls instead of twenty
+def auto_sweep(image, is_valid, window=5, workers=4):
+    estimate=otsu_threshold(image)
+    text=ocr.image_to_string(binarize(image, estimate))
+    if is_valid(text):
+        return estimate, text
+    nearby=sorted(range(max(estimate-window, 0), min(estimate+window, 256)+1),
+                  key=lambda threshold: abs(threshold-estimate))
+    return sweep_thresholds(image, [threshold for threshold in nearby if threshold!=estimate],
+                            is_valid, workers)
+
+threshold, text=auto_sweep(bigger_sign, dictionary_word)
+print("Threshold {} gave us {}".format(threshold, dictionary_word(text) if text else None))
 
 
 # In[ ]:
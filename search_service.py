@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# An asyncio keyword search service over a processed archive. The pages are loaded
+# once (from the page index, so a warm start doesn't run any OCR) and then served over
+# a small HTTP interface on a TCP port or a Unix socket:
+#
+#   GET /search?q=Mark              one JSON line per matching page with its face boxes,
+#                                   streamed as soon as each page is found
+#   GET /search?q=Mark&sheets=1     the same, with every line also carrying the page's
+#                                   contact sheet as base64 PNG, in the order they finish
+#   GET /sheet?page=a-0.png         the contact sheet of one page as a PNG
+#
+# Index lookups are dictionary lookups and run right in the event loop; the sorted token
+# list and the trigram index behind prefix and fuzzy queries are built before the
+# service starts, so no query has to build them there. Rendering a contact sheet decodes
+# a page, so it is handed to a thread pool, and a semaphore bounds how many renders run
+# at once, so a burst of queries can't pile up unbounded work behind the ones already
+# running. Queries asking for the sheet of a page that is already being rendered wait
+# for that render instead of decoding the page again.
+#
+#   python search_service.py readonly/images.zip --index parsed_pages.sqlite --port 8080
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import page_pipeline
+from contact_sheet import make_contact_sheet
+from keyword_index import KeywordIndex
+from page_index import PageIndex
+from thumbnails import FaceThumbnails
+
+REASONS = {200:'OK', 400:'Bad Request', 404:'Not Found', 405:'Method Not Allowed'}
+
+
+#run the archive through the page pipeline (answered from the index for pages already
+#processed) and return {page name -> {'text', 'faces'}}
+def load_pages(archive_path, index_path, params=None, workers=None):
+    pages = {}
+    with PageIndex(index_path) as index:
+        for img_name, result in page_pipeline.ingest(archive_path, workers=workers,
+                                                     index=index, params=params):
+            pages[img_name] = {'text':result['text'], 'faces':result['boxes']}
+    return pages
+
+
+class SearchService:
+    def __init__(self, pages, thumbnails, max_renders=4, columns=5, tile_size=(100, 100)):
+        self.pages = pages
+        self.keyword_index = KeywordIndex.from_pages(pages).prepare()
+        self.thumbnails = thumbnails
+        self.columns = columns
+        self.tile_size = tile_size
+        self._executor = ThreadPoolExecutor(max_workers=max_renders)
+        self._renders = asyncio.Semaphore(max_renders)
+        # page name -> the task rendering its sheet, while it runs
+        self._rendering = {}
+
+    #yield {'page', 'faces'} for every page matching the keyword
+    async def search(self, keyword):
+        for img_name in self.keyword_index.lookup(keyword):
+            yield {'page':img_name, 'faces':[list(box) for box in self.pages[img_name]['faces']]}
+
+    #the contact sheet of a page's faces as PNG bytes, or None if it has no faces. The
+    #render is shared by everyone asking for the page while it runs, and shielded, so a
+    #client going away doesn't cancel it for the others
+    async def contact_sheet(self, img_name):
+        boxes = self.pages[img_name]['faces']
+        if not boxes:
+            return None
+        task = self._rendering.get(img_name)
+        if task is None:
+            task = asyncio.ensure_future(self._render_sheet(img_name, boxes))
+            self._rendering[img_name] = task
+            task.add_done_callback(lambda _: self._rendering.pop(img_name, None))
+        return await asyncio.shield(task)
+
+    async def _render_sheet(self, img_name, boxes):
+        async with self._renders:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._render, img_name, boxes)
+
+    def _render(self, img_name, boxes):
+        faces = self.thumbnails.render(img_name, boxes)
+        return make_contact_sheet(faces, columns=self.columns, tile_size=self.tile_size,
+                                  format='PNG')
+
+    #search results with their contact sheets, in the order the sheets are ready
+    async def search_with_sheets(self, keyword):
+        async def with_sheet(result):
+            sheet = await self.contact_sheet(result['page'])
+            result['sheet'] = base64.b64encode(sheet).decode('ascii') if sheet else None
+            return result
+        tasks = [asyncio.ensure_future(with_sheet(result)) async for result in self.search(keyword)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2:
+                await self._respond(writer, 400, b'bad request line\n')
+                return
+            method, target = parts[0], parts[1]
+            if method != 'GET':
+                await self._respond(writer, 405, b'only GET is supported\n')
+                return
+            url = urlsplit(target)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if url.path == '/search' and query.get('q'):
+                if query.get('sheets') in ('1', 'true', 'yes'):
+                    results = self.search_with_sheets(query['q'])
+                else:
+                    results = self.search(query['q'])
+                await self._stream(writer, results)
+            elif url.path == '/sheet' and query.get('page') in self.pages:
+                sheet = await self.contact_sheet(query['page'])
+                if sheet is None:
+                    await self._respond(writer, 404, b'no faces on that page\n')
+                else:
+                    await self._respond(writer, 200, sheet, 'image/png')
+            else:
+                await self._respond(writer, 404, b'not found\n')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, content_type='text/plain'):
+        writer.write('HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+                     'Connection: close\r\n\r\n'.format(status, REASONS[status], content_type,
+                                                        len(body)).encode('latin-1'))
+        writer.write(body)
+        await writer.drain()
+
+    #send every result as one JSON line in its own HTTP chunk, as soon as it is ready
+    async def _stream(self, writer, results):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                     b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        async for result in results:
+            line = json.dumps(result).encode('utf-8') + b'\n'
+            writer.write(b'%x\r\n%s\r\n' % (len(line), line))
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    #serve on host:port, or on a Unix socket when path is given, until cancelled
+    async def serve(self, host='127.0.0.1', port=8080, path=None):
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.thumbnails.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve keyword searches over a processed archive.')
+    parser.add_argument('archive', help='the ZIP of newspaper pages')
+    parser.add_argument('--index', default='parsed_pages.sqlite', help='the page index file')
+    parser.add_argument('--params', default='{}',
+                        help='JSON detector parameters to override, as used for the index')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes for pages the index does not have yet')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix-socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--max-renders', type=int, default=os.cpu_count() or 1,
+                        help='contact sheets rendered at the same time')
+    args = parser.parse_args(argv)
+
+    params = dict(page_pipeline.DETECTOR_PARAMS, **json.loads(args.params))
+    pages = load_pages(args.archive, args.index, params, args.workers)
+
+    async def run():
+        service = SearchService(pages, FaceThumbnails(args.archive), max_renders=args.max_renders)
+        try:
+            await service.serve(args.host, args.port, args.unix_socket)
+        finally:
+            service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
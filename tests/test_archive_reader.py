@@ -0,0 +1,63 @@
+import zipfile
+
+import pytest
+
+from archive_reader import ArchiveReader
+
+ENTRIES = {
+    'stored.bin': (bytes(range(256))*40, zipfile.ZIP_STORED),
+    'deflated.txt': (b'the quick brown fox jumps over the lazy dog\n'*200, zipfile.ZIP_DEFLATED),
+    'bzip2.txt': (b'Christopher Mark pizza '*100, zipfile.ZIP_BZIP2),
+    'empty.txt': (b'', zipfile.ZIP_DEFLATED),
+    'empty-stored.txt': (b'', zipfile.ZIP_STORED),
+}
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    path = tmp_path / 'pages.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, (data, compression) in ENTRIES.items():
+            archive.writestr(name, data, compress_type=compression)
+        # an extra field after the name, which the data offset has to skip
+        info = zipfile.ZipInfo('extra.txt')
+        info.extra = b'\xfe\xca\x08\x00' + b'12345678'
+        info.compress_type = zipfile.ZIP_DEFLATED
+        archive.writestr(info, b'local extra field')
+        archive.writestr('folder/', b'')
+    return path
+
+
+def test_read_matches_zipfile(archive_path):
+    with zipfile.ZipFile(archive_path) as archive:
+        expected = {info.filename: archive.read(info) for info in archive.infolist()
+                    if not info.is_dir()}
+    with ArchiveReader(archive_path) as reader:
+        assert set(reader.infos) == set(expected)
+        for name, data in expected.items():
+            assert bytes(reader.read(name)) == data
+
+
+def test_stored_entries_are_not_copied(archive_path):
+    with ArchiveReader(archive_path) as reader:
+        data = reader.read('stored.bin')
+        assert isinstance(data, memoryview)
+        assert bytes(data) == ENTRIES['stored.bin'][0]
+        del data
+
+
+def test_bad_crc_is_detected(archive_path):
+    with ArchiveReader(archive_path) as reader:
+        reader.infos['deflated.txt'].CRC ^= 1
+        with pytest.raises(zipfile.BadZipFile):
+            reader.read('deflated.txt')
+
+
+def test_entries_filters_by_pattern_and_size(archive_path):
+    with ArchiveReader(archive_path) as reader:
+        def names(**filters):
+            return sorted(info.filename for info in reader.entries(**filters))
+        assert names(pattern='*.txt') == ['bzip2.txt', 'deflated.txt', 'empty-stored.txt',
+                                          'empty.txt', 'extra.txt']
+        assert names(min_size=1, max_size=5000) == ['bzip2.txt', 'extra.txt']
+        assert 'folder/' not in names()
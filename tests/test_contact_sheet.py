@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from contact_sheet import make_contact_sheet
+
+
+#the paste loop make_contact_sheet replaced
+def paste_sheet(tiles, columns, tile_size, rows, mode='RGB'):
+    width, height = tile_size
+    sheet = Image.new(mode, (columns*width, rows*height))
+    for i, tile in enumerate(tiles[:rows*columns]):
+        sheet.paste(tile, ((i % columns)*width, (i // columns)*height))
+    return sheet
+
+
+def random_tiles(count, tile_size, seed=0, smaller=False):
+    rng = np.random.default_rng(seed)
+    tiles = []
+    for _ in range(count):
+        width, height = tile_size
+        if smaller:
+            width, height = rng.integers(1, width + 1), rng.integers(1, height + 1)
+        tiles.append(Image.fromarray(rng.integers(0, 256, (height, width, 3), np.uint8)))
+    return tiles
+
+
+@pytest.mark.parametrize('count, columns, rows', [(1, 5, None), (12, 5, None),
+                                                  (15, 5, None), (12, 5, 2)])
+def test_matches_paste_loop(count, columns, rows):
+    tiles = random_tiles(count, (100, 80))
+    expected = paste_sheet(tiles, columns, (100, 80), rows or -(-count // columns))
+    sheet = make_contact_sheet(tiles, columns, (100, 80), rows=rows)
+    assert sheet.size == expected.size
+    assert np.array_equal(np.asarray(sheet), np.asarray(expected))
+
+
+def test_smaller_tiles_sit_top_left():
+    tiles = random_tiles(7, (50, 40), seed=1, smaller=True)
+    expected = paste_sheet(tiles, 3, (50, 40), 3)
+    assert np.array_equal(np.asarray(make_contact_sheet(tiles, 3, (50, 40))),
+                          np.asarray(expected))
+
+
+def test_numpy_stack_matches_images():
+    tiles = random_tiles(9, (30, 20), seed=2)
+    stack = np.stack([np.asarray(tile) for tile in tiles])
+    from_images = make_contact_sheet(tiles, 4, (30, 20))
+    from_stack = make_contact_sheet(stack, 4, (30, 20))
+    assert np.array_equal(np.asarray(from_images), np.asarray(from_stack))
+
+
+def test_encoded_output():
+    tiles = random_tiles(3, (10, 10), seed=3)
+    png = make_contact_sheet(tiles, 2, (10, 10), format='PNG')
+    decoded = Image.open(io.BytesIO(png))
+    assert np.array_equal(np.asarray(decoded), np.asarray(make_contact_sheet(tiles, 2, (10, 10))))
@@ -0,0 +1,18 @@
+from dictionary import clean_ocr_text, dictionary_word, load_dictionary
+
+
+def test_clean_ocr_text_keeps_only_letters():
+    assert clean_ocr_text('FOSSIL') == 'fossil'
+    assert clean_ocr_text(' (Fos$sil%]\n') == 'fossil'
+    assert clean_ocr_text('12 é!') == ''
+
+
+def test_dictionary_word(tmp_path):
+    path = tmp_path / 'words.txt'
+    path.write_text('fossil\nsign\n')
+    words = load_dictionary(str(path))
+    assert words == frozenset(['fossil', 'sign'])
+    assert load_dictionary(str(path)) is words
+    assert dictionary_word('[FOSSIL]', words) == 'fossil'
+    assert dictionary_word('F0SSIL', words) is None
+    assert dictionary_word('', words) is None
@@ -0,0 +1,82 @@
+import zipfile
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from face_store import FaceStore
+
+FACES = {
+    'one.png': [(10, 20, 40, 40), (80, 30, 60, 50)],
+    'blank.png': [],
+    'two.png': [(0, 0, 30, 30)],
+}
+
+
+def write_archive(path, seed):
+    rng = np.random.default_rng(seed)
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name in FACES:
+            page = rng.integers(0, 256, (120, 160, 3), np.uint8)
+            archive.writestr(name, cv.imencode('.png', page)[1].tobytes())
+    return path
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    return write_archive(tmp_path / 'pages.zip', 0)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    build_atlas = FaceStore.build_atlas
+
+    def counting(self, *args, **kwargs):
+        calls.append(self.pages)
+        return build_atlas(self, *args, **kwargs)
+    monkeypatch.setattr(FaceStore, 'build_atlas', counting)
+    return calls
+
+
+def test_saved_store_is_reused_memory_mapped(tmp_path, archive_path, builds):
+    path = tmp_path / 'faces'
+    built = FaceStore.cached(str(path), FACES, archive_path)
+    reused = FaceStore.cached(str(path), FACES, archive_path)
+    assert len(builds) == 1
+    assert isinstance(reused.atlas, np.memmap) and reused.atlas.mode == 'r'
+    assert reused.page_faces() == FACES
+    assert reused.entries == built.entries
+    in_memory = FaceStore.from_pages(FACES).build_atlas(archive_path)
+    assert np.array_equal(reused.atlas, in_memory.atlas)
+
+
+def test_changed_entry_rebuilds(tmp_path, archive_path, builds):
+    path = tmp_path / 'faces'
+    FaceStore.cached(str(path), FACES, archive_path)
+    # the same names, with different pages behind them
+    write_archive(archive_path, 1)
+    store = FaceStore.cached(str(path), FACES, archive_path)
+    assert len(builds) == 2
+    in_memory = FaceStore.from_pages(FACES).build_atlas(archive_path)
+    assert np.array_equal(store.atlas, in_memory.atlas)
+    assert np.array_equal(FaceStore.load(str(path)).atlas, in_memory.atlas)
+
+
+def test_changed_boxes_rebuild(tmp_path, archive_path, builds):
+    path = tmp_path / 'faces'
+    FaceStore.cached(str(path), FACES, archive_path)
+    faces = dict(FACES, **{'one.png': FACES['one.png'][:1]})
+    store = FaceStore.cached(str(path), faces, archive_path)
+    assert len(builds) == 2
+    assert len(store) == 2
+    assert FaceStore.load(str(path)).page_faces() == faces
+
+
+def test_page_without_faces_is_an_empty_slice(archive_path):
+    store = FaceStore.from_pages(FACES).build_atlas(archive_path)
+    assert store.boxes_of('blank.png') == []
+    assert len(store.page_boxes('blank.png')) == 0
+    assert store.thumbnails('blank.png').shape == (0,) + store.atlas.shape[1:]
+    assert store.boxes_of('two.png') == FACES['two.png']
+    assert len(store.thumbnails('one.png')) == 2
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from keyword_index import KeywordIndex, edit_distance
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, letter in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (letter != other)))
+        previous = current
+    return previous[-1]
+
+
+def random_words(rng, count):
+    # a small alphabet so that many words are close to each other
+    return [''.join(rng.choice('abcdeMrk') for _ in range(rng.randint(1, 10)))
+            for _ in range(count)]
+
+
+def test_edit_distance_is_bounded_levenshtein():
+    rng = random.Random(1)
+    words = random_words(rng, 500)
+    for _ in range(3000):
+        a, b, bound = rng.choice(words), rng.choice(words), rng.randint(0, 3)
+        assert edit_distance(a, b, bound) == min(levenshtein(a, b), bound + 1)
+
+
+@pytest.mark.parametrize('max_distance', [0, 1, 2, 3])
+def test_fuzzy_tokens_match_a_full_scan(max_distance):
+    rng = random.Random(max_distance)
+    index = KeywordIndex()
+    for page in range(50):
+        index.add('page-{}'.format(page), ' '.join(random_words(rng, 10)))
+    tokens = list(index.postings)
+    for _ in range(100):
+        query = rng.choice(random_words(rng, 1) + tokens)
+        distances = {token: levenshtein(query, token) for token in tokens}
+        expected = {token: distance for token, distance in distances.items()
+                    if distance <= max_distance}
+        assert index.fuzzy_tokens(query, max_distance) == expected
+
+
+def test_lookup_queries():
+    index = KeywordIndex.from_pages({
+        'a.png': {'text':'Christopher Columbus ate pizza'},
+        'b.png': {'text':'Marl< Twain wrote'},
+        'c.png': {'text':'Mark Twain and Chrlstopher'},
+    })
+    assert index.lookup('Mark') == ['c.png']
+    assert index.lookup('Mark~') == ['b.png', 'c.png']
+    assert index.lookup('Christopher~') == ['a.png', 'c.png']
+    assert index.lookup('Mark~ Twain') == ['b.png', 'c.png']
+    assert index.lookup('Chris*') == ['a.png']
+    assert index.lookup('Twain wrote') == ['b.png']
+    assert index.lookup('nothing~') == []
+    assert index.lookup_many(['Mark~', 'pizza']) == {'Mark~': ['b.png', 'c.png'],
+                                                     'pizza': ['a.png']}
+
+
+def test_new_pages_reach_fuzzy_queries():
+    index = KeywordIndex.from_pages({'a.png': {'text':'Mark'}}).prepare()
+    assert index.lookup('Marc~') == ['a.png']
+    index.add('b.png', 'Marcus')
+    assert index.lookup('Marcu~') == ['b.png']
@@ -0,0 +1,59 @@
+import zipfile
+
+import pytest
+
+from page_index import PageIndex
+
+PARAMS = {'scale_factor':1.3, 'min_neighbors':5, 'ocr_mode':'page'}
+
+
+def entry(name, crc, size):
+    info = zipfile.ZipInfo(name)
+    info.CRC = crc
+    info.file_size = size
+    return info
+
+
+@pytest.fixture
+def index(tmp_path):
+    with PageIndex(str(tmp_path / 'pages.sqlite')) as index:
+        yield index
+
+
+def test_store_and_lookup(index):
+    page = entry('a.png', 1234, 5678)
+    assert index.lookup(page, PARAMS) is None
+    index.store(page, PARAMS, {'text':'Christopher', 'boxes':[(1, 2, 3, 4), (5, 6, 7, 8)]})
+    index.store(entry('b.png', 1, 2), PARAMS, {'text':'', 'boxes':[]})
+    assert index.lookup(page, PARAMS) == {'text':'Christopher',
+                                          'boxes':[(1, 2, 3, 4), (5, 6, 7, 8)]}
+    assert index.lookup(entry('b.png', 1, 2), PARAMS) == {'text':'', 'boxes':[]}
+    # the same parameters in another order are the same key
+    assert index.lookup(page, dict(reversed(list(PARAMS.items())))) is not None
+    assert index.lookup(page, dict(PARAMS, min_neighbors=6)) is None
+    assert index.lookup(entry('a.png', 1234, 5679), PARAMS) is None
+
+
+def test_lookup_after_reopening(tmp_path):
+    path = str(tmp_path / 'pages.sqlite')
+    with PageIndex(path) as index:
+        index.store(entry('a.png', 1, 2), PARAMS, {'text':'pizza', 'boxes':[(1, 2, 3, 4)]})
+    with PageIndex(path) as index:
+        assert index.lookup(entry('a.png', 1, 2), PARAMS) == {'text':'pizza',
+                                                              'boxes':[(1, 2, 3, 4)]}
+
+
+def test_store_replaces_older_entry(index):
+    old = entry('a.png', 1, 100)
+    new = entry('a.png', 2, 120)
+    index.store(old, PARAMS, {'text':'old', 'boxes':[(1, 1, 1, 1), (2, 2, 2, 2)]})
+    other = dict(PARAMS, min_neighbors=6)
+    index.store(old, other, {'text':'other', 'boxes':[]})
+    index.store(new, PARAMS, {'text':'new', 'boxes':[(3, 3, 3, 3)]})
+    assert index.lookup(old, PARAMS) is None
+    assert index.lookup(new, PARAMS) == {'text':'new', 'boxes':[(3, 3, 3, 3)]}
+    # results for other parameters are kept
+    assert index.lookup(old, other) == {'text':'other', 'boxes':[]}
+    pages, = index.connection.execute('SELECT COUNT(*) FROM pages').fetchone()
+    faces, = index.connection.execute('SELECT COUNT(*) FROM faces').fetchone()
+    assert (pages, faces) == (2, 1)
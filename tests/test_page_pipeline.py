@@ -0,0 +1,46 @@
+import os
+import zipfile
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import page_pipeline
+from page_index import PageIndex
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARAMS = dict(page_pipeline.DETECTOR_PARAMS, ocr_mode='none')
+# not in name order, so yielding sorted or in completion order shows
+NAMES = ['c.png', 'a.jpg', 'e.png', 'b.png', 'd.jpg', 'f.png']
+
+
+@pytest.fixture(autouse=True)
+def cascade(monkeypatch):
+    monkeypatch.setattr(page_pipeline, 'CASCADE_PATH',
+                        os.path.join(HERE, 'haarcascade_frontalface_default.xml'))
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / 'pages.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        for i, name in enumerate(NAMES):
+            # pages of different sizes take different times to process
+            page = rng.integers(0, 256, (100 + 60*(i % 3), 120, 3), np.uint8)
+            archive.writestr(name, cv.imencode(os.path.splitext(name)[1], page)[1].tobytes())
+    return str(path)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_ingest_yields_in_archive_order(tmp_path, archive_path, workers):
+    with PageIndex(str(tmp_path / 'pages.sqlite')) as index:
+        # some of the pages are answered from the index, the others are processed
+        warm = list(page_pipeline.ingest(archive_path, workers, index, PARAMS, pattern='*.jpg'))
+        assert [name for name, _ in warm] == ['a.jpg', 'd.jpg']
+        results = list(page_pipeline.ingest(archive_path, workers, index, PARAMS))
+        assert [name for name, _ in results] == NAMES
+        assert list(page_pipeline.ingest(archive_path, workers, index, PARAMS)) == results
+    cold = list(page_pipeline.ingest(archive_path, workers, params=PARAMS))
+    assert [(name, result['boxes']) for name, result in cold] == \
+        [(name, list(result['boxes'])) for name, result in results]
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Face thumbnails, cut from the pages only when a search shows them. A face is just a
+# (page name, box) record until then. Rendered thumbnails are kept in a bounded LRU
+# cache, so repeated searches don't decode the same page again.
+
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from archive_reader import ArchiveReader
+from page_pipeline import Page
+
+THUMBNAIL_SIZE = (100, 100)
+
+
+#an LRU cache of PIL images, bounded by a number of images and by their pixel memory
+class ThumbnailCache:
+    def __init__(self, max_items=2000, max_bytes=64*1024*1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._images:
+                self.bytes -= _image_bytes(self._images.pop(key))
+            self._images[key] = image
+            self.bytes += _image_bytes(image)
+            while self._images and (len(self._images) > self.max_items
+                                    or self.bytes > self.max_bytes):
+                _, evicted = self._images.popitem(last=False)
+                self.bytes -= _image_bytes(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        return {'items':len(self._images), 'bytes':self.bytes, 'hits':self.hits,
+                'misses':self.misses, 'evictions':self.evictions}
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+#the thumbnail of one (x,y,w,h) face box of a page: the face shrunk to fit in size,
+#keeping its aspect ratio
+def cut_thumbnail(page, box, size=THUMBNAIL_SIZE):
+    face = page.rgb_crop(box)
+    face.thumbnail(size, Image.LANCZOS)
+    return face
+
+
+#renders the thumbnails of the faces of one archive through a ThumbnailCache. All the
+#faces of a page that aren't cached yet are cut in one go, so a page is decoded at most
+#once per search
+class FaceThumbnails:
+    def __init__(self, archive_path, size=THUMBNAIL_SIZE, cache=None):
+        self.archive_path = archive_path
+        self.size = tuple(size)
+        self.cache = cache if cache is not None else ThumbnailCache()
+        self._archive = None
+        self._lock = threading.Lock()
+
+    def _page(self, img_name):
+        with self._lock:
+            if self._archive is None:
+                self._archive = ArchiveReader(self.archive_path)
+        # an ArchiveReader can be read from several threads at once
+        return Page.from_archive(self._archive, img_name)
+
+    #the thumbnails of the given (x,y,w,h) face boxes of a page, in the same order
+    def render(self, img_name, boxes):
+        keys = [(img_name, tuple(box), self.size) for box in boxes]
+        thumbnails = [self.cache.get(key) for key in keys]
+        missing = [i for i, thumbnail in enumerate(thumbnails) if thumbnail is None]
+        if missing:
+            page = self._page(img_name)
+            for i in missing:
+                face = cut_thumbnail(page, keys[i][1], self.size)
+                self.cache.put(keys[i], face)
+                thumbnails[i] = face
+            page.release()
+        return thumbnails
+
+    def stats(self):
+        return self.cache.stats()
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
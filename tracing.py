@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-page, per-stage timing for the page pipeline. Pass a PageTracer to
+# page_pipeline.ingest() and every page records the wall and CPU time of each of its
+# stages, its size, its face count and the length of its OCR text:
+#
+#   tracer = PageTracer()
+#   results = dict(page_pipeline.ingest(ARCHIVE_PATH, tracer=tracer))
+#   print(tracer.report(10))
+#
+# When no tracer is given the pipeline uses NULL_TRACER, whose stage() hands back one
+# shared do-nothing context manager, so the cost of tracing switched off is a method
+# call per stage.
+
+import contextlib
+import time
+
+
+class PageTracer:
+    enabled = True
+
+    def __init__(self):
+        # page name -> {'stages': {stage: {'wall_s', 'cpu_s'}}, plus annotations}
+        self.records = {}
+
+    def _record(self, page_name):
+        record = self.records.get(page_name)
+        if record is None:
+            record = self.records[page_name] = {'stages':{}}
+        return record
+
+    #time the body of the with statement as one stage of a page. A stage that runs more
+    #than once for the same page adds up
+    @contextlib.contextmanager
+    def stage(self, page_name, stage):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stages = self._record(page_name)['stages']
+            timing = stages.setdefault(stage, {'wall_s':0.0, 'cpu_s':0.0})
+            timing['wall_s'] += wall
+            timing['cpu_s'] += cpu
+
+    #attach facts about a page to its record, e.g. width=..., faces=...
+    def annotate(self, page_name, **info):
+        self._record(page_name).update(info)
+
+    #add a record made by another tracer, e.g. the one in a pool worker
+    def merge(self, page_name, record):
+        ours = self._record(page_name)
+        for stage, timing in record.get('stages', {}).items():
+            total = ours['stages'].setdefault(stage, {'wall_s':0.0, 'cpu_s':0.0})
+            total['wall_s'] += timing['wall_s']
+            total['cpu_s'] += timing['cpu_s']
+        ours.update((key, value) for key, value in record.items() if key != 'stages')
+
+    def page_time(self, page_name, stage=None):
+        stages = self.records[page_name]['stages']
+        if stage is not None:
+            return stages.get(stage, {}).get('wall_s', 0.0)
+        return sum(timing['wall_s'] for timing in stages.values())
+
+    #(page name, record) pairs, slowest first, by total wall time or by one stage
+    def slowest_pages(self, count=10, stage=None):
+        names = sorted(self.records, key=lambda name: self.page_time(name, stage), reverse=True)
+        return [(name, self.records[name]) for name in names[:count]]
+
+    #the slowest pages as a text table, one row per page and one column per stage
+    def report(self, count=10, stage=None):
+        stage_names = []
+        for record in self.records.values():
+            for name in record['stages']:
+                if name not in stage_names:
+                    stage_names.append(name)
+        header = ['page', 'total_s'] + [name + '_s' for name in stage_names] + \
+                 ['size', 'faces', 'chars']
+        rows = [header]
+        for name, record in self.slowest_pages(count, stage):
+            size = '{}x{}'.format(record['width'], record['height']) if 'width' in record else ''
+            rows.append([name, '{:.3f}'.format(self.page_time(name))] +
+                        ['{:.3f}'.format(record['stages'].get(stage_name, {}).get('wall_s', 0.0))
+                         for stage_name in stage_names] +
+                        [size, str(record.get('faces', '')), str(record.get('chars', ''))])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths))
+                         for row in rows)
+
+
+class NullTracer:
+    enabled = False
+    _context = contextlib.nullcontext()
+
+    def stage(self, page_name, stage):
+        return self._context
+
+    def annotate(self, page_name, **info):
+        pass
+
+    def merge(self, page_name, record):
+        pass
+
+
+NULL_TRACER = NullTracer()